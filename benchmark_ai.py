@@ -0,0 +1,132 @@
+"""
+Benchmark of the AI generation path against the local mock Ollama server.
+
+Seeds the AI-heavy domains with each AI mode (and runs the CSV generator's
+domain functions), then reports rows/s, server-side p50/p99 per-call latency
+and the share of AI cells that fell back to Faker:
+
+    python benchmark_ai.py --rows 500 --latency lognormal --median 0.3 --error-rate 0.05
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, '.')
+
+import yaml
+from rich.console import Console
+
+from core.db_connector import DBConnector
+from core.schema_parser import SchemaParser
+from core.generator import DataGenerator
+from core.mock_ollama import MockOllama, Latency
+import universal_generator
+
+# ai settings per mode, applied over settings.yaml's `ai` section
+MODES = {
+    'sync': {'values_per_call': 1, 'async_requests': False, 'background_prefetch': False},
+    'batched': {'values_per_call': 20, 'async_requests': False, 'background_prefetch': False},
+    'async': {'values_per_call': 20, 'async_requests': True, 'background_prefetch': False},
+    'prefetch': {'values_per_call': 20, 'async_requests': False, 'background_prefetch': True},
+}
+DOMAINS = ['Healthcare', 'Education']
+CSV_DOMAINS = {
+    'healthcare': universal_generator.generate_healthcare_data,
+    'education': universal_generator.generate_education_data,
+}
+
+def fallback_ratio(from_ai, from_fallback):
+    total = from_ai + from_fallback
+    return from_fallback / total if total else 0.0
+
+def run_seeder(config, mock, mode, rows, workdir, cached=False):
+    """Seeds DOMAINS with one AI mode; returns a result row."""
+    config = dict(config)
+    config['ai'] = dict(config['ai'], api_url=mock.url, **MODES[mode])
+    config['ai']['cache'] = dict(config['ai'].get('cache') or {}, enabled=cached,
+                                 path=os.path.join(workdir, 'llm_cache.db'))
+    mock.reset()
+    total_rows, from_ai, from_fallback, elapsed = 0, 0, 0, 0.0
+    for domain in DOMAINS:
+        db = DBConnector(config)
+        db.db_path = os.path.join(workdir, f'{mode}.db')
+        db.init_domain(domain)
+        parser = SchemaParser(db)
+        parser.build_dependency_graph()
+        with DataGenerator(db, config) as generator:
+            start = time.perf_counter()
+            results = generator.seed_tables(parser.get_generations(), rows)
+            elapsed += time.perf_counter() - start
+            total_rows += sum(results.values())
+            from_ai += sum(st['ai_cells'] for st in generator.ai_stats.values())
+            from_fallback += sum(st['fallback_cells'] for st in generator.ai_stats.values())
+    st = mock.stats()
+    name = f"seed_table {mode}" + (" (warm cache)" if cached else "")
+    return [name, total_rows / elapsed, st['calls'], st['p50'], st['p99'], fallback_ratio(from_ai, from_fallback)]
+
+def run_csv(config, mock, rows, workdir):
+    """Runs the CSV generator's AI domain functions; returns a result row."""
+    universal_generator.AI_MODE = True
+    universal_generator.OLLAMA_URL = mock.url
+    universal_generator.EXPORT_DIR = os.path.join(workdir, 'exports')
+    universal_generator.console = Console(quiet=True)
+    universal_generator.prefetcher = None
+    mock.reset()
+    start = time.perf_counter()
+    for generate in CSV_DOMAINS.values():
+        generate(rows)
+    elapsed = time.perf_counter() - start
+    prefetcher = universal_generator.prefetcher
+    prefetcher.stop()
+    st = mock.stats()
+    total_rows = rows * 2 * len(CSV_DOMAINS)
+    return ["universal_generator", total_rows / elapsed, st['calls'], st['p50'], st['p99'],
+            fallback_ratio(prefetcher.ai_cells, prefetcher.fallback_cells)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AI generation path against a mock Ollama server")
+    parser.add_argument("--rows", type=int, default=200, help="rows per table")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated: " + ", ".join(MODES))
+    parser.add_argument("--latency", default="lognormal", choices=["constant", "uniform", "normal", "lognormal"])
+    parser.add_argument("--median", type=float, default=0.2, help="seconds per call")
+    parser.add_argument("--sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--no-csv", action="store_true", help="skip universal_generator")
+    args = parser.parse_args()
+
+    with open("config/settings.yaml", "r") as f:
+        config = yaml.safe_load(f)
+    config['generation']['use_ai_mode'] = True
+
+    latency = Latency(args.latency, args.median, args.sigma)
+    # Hung calls last just past the client timeout, so they count as timeouts
+    hang_seconds = config['ai'].get('timeout', 60) + 1
+    workdir = tempfile.mkdtemp(prefix="dataforge_bench_")
+    results = []
+    try:
+        with MockOllama(latency=latency, error_rate=args.error_rate, hang_rate=args.hang_rate,
+                        hang_seconds=hang_seconds, malformed_rate=args.malformed_rate) as mock:
+            print(f"Mock Ollama on {mock.url}: {args.latency} latency, median {args.median * 1000:.0f} ms, "
+                  f"{args.error_rate:.0%} errors, {args.hang_rate:.0%} hangs, {args.malformed_rate:.0%} malformed")
+            for mode in args.modes.split(","):
+                print(f"Running {mode}...")
+                results.append(run_seeder(config, mock, mode, args.rows, workdir))
+                if mode == 'batched':
+                    run_seeder(config, mock, mode, args.rows, workdir, cached=True) # fill the cache
+                    results.append(run_seeder(config, mock, mode, args.rows, workdir, cached=True))
+            if not args.no_csv:
+                print("Running universal_generator...")
+                results.append(run_csv(config, mock, args.rows, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{'path':<32} {'rows/s':>10} {'calls':>7} {'p50 ms':>8} {'p99 ms':>8} {'fallback':>9}")
+    for name, rate, calls, p50, p99, fallback in results:
+        print(f"{name:<32} {rate:>10.0f} {calls:>7} {p50 * 1000:>8.0f} {p99 * 1000:>8.0f} {fallback:>9.0%}")
+
+if __name__ == "__main__":
+    main()
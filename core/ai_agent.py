@@ -1,12 +1,76 @@
+import asyncio
 import requests
 import json
 import logging
+import os
+import random
+import re
+import ssl
+import time
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+from core.ai_cache import ResponseCache
+
+# Longest value accepted from a batch reply; anything longer is the model rambling
+MAX_VALUE_LENGTH = 200
+
+LIST_ITEM = re.compile(r'^\s*(?:\d+[.)]|[-*\u2022])\s*(.+?)\s*$')
+
+def parse_batch_reply(text, n):
+    """
+    Extracts up to n distinct values from a batch reply: a JSON array of
+    strings, or else a numbered / bulleted list. Empty, multi-line or overlong
+    items are dropped.
+    """
+    items = None
+    start, end = text.find('['), text.rfind(']')
+    if start != -1 and end > start:
+        try:
+            parsed = json.loads(text[start:end + 1])
+            if isinstance(parsed, list):
+                items = [str(v) for v in parsed if isinstance(v, (str, int, float))]
+        except ValueError:
+            pass
+    if items is None:
+        items = [m.group(1) for m in map(LIST_ITEM.match, text.splitlines()) if m]
+
+    values, seen = [], set()
+    for item in items:
+        val = item.strip().strip('"').strip()
+        if not val or '\n' in val or len(val) > MAX_VALUE_LENGTH or val.lower() in seen:
+            continue
+        seen.add(val.lower())
+        values.append(val)
+        if len(values) == n:
+            break
+    return values
+
+def text_prompt(table_name, column_name, context_hint=""):
+    return f"Generate a realistic, short {column_name} for a database entry in a table named {table_name}. {context_hint} Return ONLY the value."
+
+def batch_prompt(table_name, column_name, n, context_hint=""):
+    return (f"Generate {n} distinct, realistic, short values for the {column_name} column of a database "
+            f"table named {table_name}. {context_hint} Return ONLY a JSON array of {n} strings.")
 
 class AIAgent:
     def __init__(self, config):
         self.api_url = config['ai']['api_url']
         self.model = config['ai']['model']
         self.enabled = config['generation']['use_ai_mode']
+        self.timeout = config['ai'].get('timeout', 60) # Generous default for local LLMs
+        self.options = config['ai'].get('options') or {} # Ollama sampling options (temperature, ...)
+        self.cache = ResponseCache.from_config(config['ai'])
+
+        # Keep-alive connection pool to the model server, reused for every call
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config['ai'].get('pool_size', 4))
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+        self.calls = 0
+        self.errors = 0
+        self.latency = 0.0
 
     def generate_text(self, table_name, column_name, context_hint=""):
         """
@@ -15,20 +79,265 @@ class AIAgent:
         if not self.enabled:
             return None
 
-        prompt = f"Generate a realistic, short {column_name} for a database entry in a table named {table_name}. {context_hint} Return ONLY the value."
-        
+        prompt = text_prompt(table_name, column_name, context_hint)
+
         payload = {
             "model": self.model,
             "prompt": prompt,
             "stream": False
         }
-        
+        if self.options:
+            payload["options"] = self.options
+
+        if self.cache is not None:
+            cached = self.cache.get(self.model, prompt, self.options)
+            if cached is not None:
+                return cached
+
+        start = time.perf_counter()
+        self.calls += 1
         try:
-            response = requests.post(self.api_url, json=payload, timeout=60) # Increased timeout for local LLM
+            response = self.session.post(self.api_url, json=payload, timeout=self.timeout)
             if response.status_code == 200:
                 data = response.json()
-                return data.get("response", "").strip().strip('"')
+                text = data.get("response", "").strip().strip('"')
+                if self.cache is not None:
+                    self.cache.put(self.model, prompt, text, self.options)
+                return text
+            self.errors += 1
         except requests.exceptions.RequestException:
-            pass # Fallback to Faker silently
-        
+            self.errors += 1 # Fallback to Faker silently
+        finally:
+            self.latency += time.perf_counter() - start
+
+        return None
+
+    def generate_batch(self, table_name, column_name, n, context_hint=""):
+        """
+        Asks for n distinct values of a column in one call.
+        Returns the valid values parsed from the reply (possibly fewer than n, or none).
+        """
+        if not self.enabled:
+            return []
+
+        prompt = batch_prompt(table_name, column_name, n, context_hint)
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False
+        }
+        if self.options:
+            payload["options"] = self.options
+
+        # The cache keeps whole replies, so a warm prompt hands back a full batch
+        if self.cache is not None:
+            cached = self.cache.get(self.model, prompt, self.options)
+            if cached is not None:
+                return parse_batch_reply(cached, n)
+
+        start = time.perf_counter()
+        self.calls += 1
+        try:
+            response = self.session.post(self.api_url, json=payload, timeout=self.timeout)
+            if response.status_code == 200:
+                text = response.json().get("response", "")
+                values = parse_batch_reply(text, n)
+                if values and self.cache is not None:
+                    self.cache.put(self.model, prompt, text, self.options)
+                if not values:
+                    self.errors += 1 # Malformed reply
+                return values
+            self.errors += 1
+        except (requests.exceptions.RequestException, ValueError):
+            self.errors += 1
+        finally:
+            self.latency += time.perf_counter() - start
+
+        return []
+
+    def connections_opened(self):
+        """Number of TCP connections opened so far (1 per pool slot with keep-alive)."""
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def get_stats(self):
+        """Per-process call statistics, reported back to the seeder."""
+        return {
+            'pid': os.getpid(),
+            'calls': self.calls,
+            'errors': self.errors,
+            'connections': self.connections_opened(),
+            'avg_latency': self.latency / self.calls if self.calls else 0.0,
+            'cache_hits': self.cache.hits if self.cache is not None else 0,
+        }
+
+class AIRequestError(Exception):
+    """A non-200 or unreadable reply from the model server."""
+
+class AsyncAIClient:
+    """
+    asyncio client for the Ollama API, for many AI requests in flight from one
+    worker process while it keeps generating the other columns.
+
+    At most `ai.max_in_flight` requests run at once, each over a keep-alive
+    connection taken from a small idle pool. A request that fails or exceeds
+    `ai.timeout` is retried up to `ai.retries` times after an exponential
+    backoff (`ai.retry_backoff` seconds, doubled per attempt) with jitter.
+    Cancelling a request's task closes its connection. Speaks plain HTTP/1.1
+    over asyncio streams, so it needs nothing beyond the standard library.
+    """
+    def __init__(self, ai_config):
+        url = urlsplit(ai_config['api_url'])
+        self.host = url.hostname
+        self.secure = url.scheme == 'https'
+        self.port = url.port or (443 if self.secure else 80)
+        self.path = url.path or '/'
+        self.model = ai_config['model']
+        self.options = ai_config.get('options') or {}
+        self.timeout = ai_config.get('timeout', 60)
+        self.max_in_flight = ai_config.get('max_in_flight', 8)
+        self.retries = ai_config.get('retries', 2)
+        self.retry_backoff = ai_config.get('retry_backoff', 0.5)
+        self.cache = ResponseCache.from_config(ai_config)
+
+        self.semaphore = None
+        self.idle = []
+
+        self.calls = 0
+        self.errors = 0
+        self.retried = 0
+        self.connections = 0
+        self.latency = 0.0
+
+    async def connect(self):
+        if self.idle:
+            return self.idle.pop()
+        self.connections += 1
+        return await asyncio.open_connection(
+            self.host, self.port, ssl=ssl.create_default_context() if self.secure else None
+        )
+
+    async def read_body(self, reader, headers):
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b''
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    return body
+                body += await reader.readexactly(size)
+                await reader.readline()
+        return await reader.readexactly(int(headers.get('content-length', 0)))
+
+    async def post(self, payload):
+        """One POST of payload as JSON; returns the decoded JSON reply."""
+        data = json.dumps(payload).encode()
+        reader, writer = await self.connect()
+        try:
+            writer.write(
+                f"POST {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                f"Connection: keep-alive\r\n\r\n".encode() + data
+            )
+            await writer.drain()
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionError("connection closed by the model server")
+            status = int(status_line.split()[1])
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await self.read_body(reader, headers)
+        except BaseException:
+            # Errors, timeouts and cancellation leave the stream in an unknown state
+            writer.close()
+            raise
+        if headers.get('connection', '').lower() == 'close':
+            writer.close()
+        else:
+            self.idle.append((reader, writer))
+        if status != 200:
+            raise AIRequestError(f"HTTP {status}")
+        return json.loads(body)
+
+    async def request(self, prompt):
+        """Response text for prompt (through the cache), or None after the last retry."""
+        if self.cache is not None:
+            cached = self.cache.get(self.model, prompt, self.options)
+            if cached is not None:
+                return cached
+
+        payload = {"model": self.model, "prompt": prompt, "stream": False}
+        if self.options:
+            payload["options"] = self.options
+
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        async with self.semaphore:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self.retried += 1
+                    await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+                start = time.perf_counter()
+                self.calls += 1
+                try:
+                    data = await asyncio.wait_for(self.post(payload), self.timeout)
+                    return data.get("response", "")
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, AIRequestError, ValueError, IndexError):
+                    self.errors += 1
+                finally:
+                    self.latency += time.perf_counter() - start
         return None
+
+    async def generate_text(self, table_name, column_name, context_hint=""):
+        prompt = text_prompt(table_name, column_name, context_hint)
+        text = await self.request(prompt)
+        if not text:
+            return None
+        value = text.strip().strip('"')
+        if self.cache is not None:
+            self.cache.put(self.model, prompt, value, self.options)
+        return value
+
+    async def generate_batch(self, table_name, column_name, n, context_hint=""):
+        prompt = batch_prompt(table_name, column_name, n, context_hint)
+        text = await self.request(prompt)
+        if not text:
+            return []
+        values = parse_batch_reply(text, n)
+        if values and self.cache is not None:
+            self.cache.put(self.model, prompt, text, self.options)
+        return values
+
+    async def generate_values(self, table_name, column_name, n, per_call=1, context_hint=""):
+        """
+        n values for a column, from concurrent calls of per_call values each
+        (per_call=1 uses single-value prompts). Failed calls contribute nothing.
+        """
+        if per_call > 1:
+            calls = [self.generate_batch(table_name, column_name, per_call, context_hint)
+                     for _ in range(-(-n // per_call))]
+            return [v for values in await asyncio.gather(*calls) for v in values]
+        values = await asyncio.gather(*[self.generate_text(table_name, column_name, context_hint) for _ in range(n)])
+        return [v for v in values if v is not None]
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+
+    def get_stats(self):
+        """Per-process call statistics, in the same shape as AIAgent.get_stats()."""
+        return {
+            'pid': os.getpid(),
+            'calls': self.calls,
+            'errors': self.errors,
+            'retries': self.retried,
+            'connections': self.connections,
+            'avg_latency': self.latency / self.calls if self.calls else 0.0,
+            'cache_hits': self.cache.hits if self.cache is not None else 0,
+        }
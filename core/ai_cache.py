@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import time
+
+DEFAULT_CACHE_PATH = ".dataforge_cache/llm_cache.db"
+DEFAULT_MAX_ENTRIES = 50000
+DEFAULT_VARIANTS = 5
+
+# last_used is only rewritten when it is older than this, so warm hits stay read-only
+TOUCH_INTERVAL = 60
+# Eviction check every this many stored responses
+EVICT_EVERY = 100
+
+class ResponseCache:
+    """
+    On-disk cache of LLM responses keyed by (model, prompt, params), shared by
+    every worker process through one SQLite file in WAL mode.
+
+    Each prompt keeps up to `variants` responses: until it has them all, get()
+    misses so the caller asks the model again and put() adds another variant;
+    after that, get() serves a random one without touching the model. Full
+    prompts are also kept in memory per process. Once the file holds more than
+    max_entries responses the least recently used ones are evicted.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, variants=DEFAULT_VARIANTS):
+        self.path = path
+        self.max_entries = max_entries
+        self.variants = max(1, variants)
+        self.conn = None
+        self.pid = None
+        self.memory = {} # key -> ([responses], last_used as last written)
+        self.puts = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, ai_config):
+        """Builds the cache from the `ai.cache` settings, or returns None when it is disabled."""
+        settings = (ai_config or {}).get('cache') or {}
+        if not settings.get('enabled', False):
+            return None
+        return cls(settings.get('path', DEFAULT_CACHE_PATH),
+                   settings.get('max_entries', DEFAULT_MAX_ENTRIES),
+                   settings.get('variants', DEFAULT_VARIANTS))
+
+    @staticmethod
+    def make_key(model, prompt, params=None):
+        raw = json.dumps([model, prompt, params or {}], sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def connect(self):
+        # SQLite connections must not cross a fork; every process opens its own
+        if self.conn is None or self.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT NOT NULL,
+                    variant INTEGER NOT NULL,
+                    response TEXT NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (key, variant)
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used)")
+            self.pid = os.getpid()
+            self.memory = {}
+        return self.conn
+
+    def get(self, model, prompt, params=None):
+        """A cached response for the prompt, or None when it still needs more variants."""
+        key = self.make_key(model, prompt, params)
+        entry = self.memory.get(key)
+        if entry is None:
+            rows = self.connect().execute(
+                "SELECT response, last_used FROM responses WHERE key = ?", (key,)
+            ).fetchall()
+            if len(rows) < self.variants:
+                self.misses += 1
+                return None
+            entry = self.memory[key] = ([r[0] for r in rows], max(r[1] for r in rows))
+        cached, last_used = entry
+        # Memory hits count as uses too, or a hot prompt would look idle to evict()
+        if time.time() - last_used > TOUCH_INTERVAL:
+            self.touch(key)
+        self.hits += 1
+        return random.choice(cached)
+
+    def touch(self, key):
+        now = time.time()
+        self.connect().execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        if key in self.memory:
+            self.memory[key] = (self.memory[key][0], now)
+
+    def put(self, model, prompt, response, params=None):
+        """Stores one more variant for the prompt (ignored once it has them all)."""
+        if not response:
+            return
+        key = self.make_key(model, prompt, params)
+        conn = self.connect()
+        try:
+            # Scalar subqueries rather than HAVING without GROUP BY, which SQLite < 3.39 rejects
+            conn.execute(
+                "INSERT INTO responses (key, variant, response, last_used) "
+                "SELECT ?, (SELECT COALESCE(MAX(variant), -1) + 1 FROM responses WHERE key = ?), ?, ? "
+                "WHERE (SELECT COUNT(*) FROM responses WHERE key = ?) < ?",
+                (key, key, response, time.time(), key, self.variants)
+            )
+        except sqlite3.IntegrityError:
+            return # Another worker stored the same variant number first
+        self.puts += 1
+        if self.puts % EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        """Drops the least recently used responses beyond max_entries."""
+        conn = self.connect()
+        count = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM responses WHERE rowid IN "
+                "(SELECT rowid FROM responses ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def __len__(self):
+        return self.connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        if self.conn is not None and self.pid == os.getpid():
+            self.conn.close()
+        self.conn = None
@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import deque
+
+from core.ai_agent import AIAgent
+
+class CircuitBreaker:
+    """
+    Stops calling an endpoint after `threshold` failed calls in a row.
+    Once `cooldown` seconds have passed, one trial call is let through
+    (half-open): a success closes the breaker again, a failure re-opens it.
+    """
+    def __init__(self, threshold=3, cooldown=30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.time() - self.opened_at >= self.cooldown:
+                self.opened_at = time.time() # One trial per cooldown
+                return True
+            return False
+
+    def record(self, ok):
+        with self.lock:
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self.failures >= self.threshold:
+                    self.opened_at = time.time()
+
+class AIPrefetcher:
+    """
+    Background service that keeps a pool of AI values per (table, column,
+    context) warm while seeding runs, so generation never blocks on the model.
+
+    Daemon threads (ai.prefetch_threads, each with its own AIAgent) refill
+    the emptiest pool below ai.prefetch_pool values, ai.values_per_call
+    values per call. take() hands out a pooled value, or None so the caller
+    uses Faker instead. An empty pool may be waited on for at most
+    ai.max_wait seconds per cell and ai.table_budget seconds per table in
+    total; once the breaker is open nothing waits at all.
+    """
+    def __init__(self, ai_config):
+        self.ai_config = ai_config
+        self.pool_size = ai_config.get('prefetch_pool', 100)
+        self.per_call = max(1, ai_config.get('values_per_call', 20))
+        self.thread_count = ai_config.get('prefetch_threads', 2)
+        self.table_budget = ai_config.get('table_budget', 2.0)
+        self.max_wait = ai_config.get('max_wait', 0.25)
+        self.breaker = CircuitBreaker(ai_config.get('breaker_threshold', 3), ai_config.get('breaker_cooldown', 30))
+
+        self.pools = {}
+        self.requested = {}
+        self.spent = {}
+        self.ai_cells = 0
+        self.fallback_cells = 0
+
+        self.cond = threading.Condition()
+        self.stopped = False
+        self.threads = []
+        self.agents = []
+
+    def register(self, table, column, context_hint=""):
+        """Starts warming a pool for the column (and the threads, on first use)."""
+        key = (table, column, context_hint)
+        with self.cond:
+            if key not in self.pools:
+                self.pools[key] = deque()
+                self.requested[key] = 0
+                self.cond.notify_all()
+            if not self.threads:
+                for i in range(self.thread_count):
+                    thread = threading.Thread(target=self.run, name=f"ai-prefetch-{i}", daemon=True)
+                    self.threads.append(thread)
+                    thread.start()
+        return key
+
+    def next_key(self):
+        """The registered column with the fewest values pooled or on the way, if any is below target."""
+        best, best_fill = None, self.pool_size
+        for key, pool in self.pools.items():
+            fill = len(pool) + self.requested[key]
+            if fill < best_fill:
+                best, best_fill = key, fill
+        return best
+
+    def run(self):
+        agent = AIAgent({'ai': self.ai_config, 'generation': {'use_ai_mode': True}})
+        with self.cond:
+            self.agents.append(agent)
+        while True:
+            with self.cond:
+                key = None
+                while not self.stopped:
+                    key = self.next_key()
+                    if key is not None:
+                        break
+                    self.cond.wait()
+                if self.stopped:
+                    return
+                self.requested[key] += self.per_call
+            if not self.breaker.allow():
+                with self.cond:
+                    self.requested[key] -= self.per_call
+                    self.cond.wait(min(self.breaker.cooldown, 1.0))
+                continue
+
+            values = self.fetch(agent, key)
+            self.breaker.record(bool(values))
+            with self.cond:
+                self.requested[key] -= self.per_call
+                self.pools[key].extend(values)
+                self.cond.notify_all()
+
+    def fetch(self, agent, key):
+        table, column, context_hint = key
+        if self.per_call > 1:
+            return agent.generate_batch(table, column, self.per_call, context_hint)
+        val = agent.generate_text(table, column, context_hint)
+        return [val] if val else []
+
+    def take(self, table, column, context_hint=""):
+        """A prefetched value for the column, or None when the caller should use Faker."""
+        key = (table, column, context_hint)
+        if key not in self.pools:
+            self.register(table, column, context_hint)
+        with self.cond:
+            pool = self.pools[key]
+            if not pool and not self.breaker.is_open:
+                wait = min(self.max_wait, self.table_budget - self.spent.get(table, 0.0))
+                if wait > 0:
+                    start = time.perf_counter()
+                    self.cond.wait_for(lambda: pool or self.breaker.is_open, wait)
+                    self.spent[table] = self.spent.get(table, 0.0) + time.perf_counter() - start
+            if pool:
+                self.ai_cells += 1
+                return pool.popleft()
+            self.fallback_cells += 1
+            return None
+
+    def ai_share(self):
+        total = self.ai_cells + self.fallback_cells
+        return self.ai_cells / total if total else 0.0
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
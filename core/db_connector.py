@@ -1,7 +1,639 @@
 import sqlite3
+import hashlib
+import json
 import os
+import re
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import closing
+
+from core.row_counts import RowCounts
+
+# Load-time PRAGMAs applied by a bulk-load session, overridable from the `load` section of settings.yaml
+LOAD_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'OFF',
+    'cache_size': -65536, # negative = KiB, i.e. 64 MB
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,
+}
+
+class ForeignKeyError(Exception):
+    """Raised after a load whose final foreign-key validation found violations."""
+    def __init__(self, violations):
+        self.violations = violations
+        super().__init__(f"{len(violations)} foreign key violation(s), first: {violations[0]}")
+
+class RestoreError(Exception):
+    """Raised when indexes or triggers dropped for a load could not be recreated."""
+    def __init__(self, failed, violations=()):
+        self.failed = failed # (sql, error) per object that is missing now
+        self.violations = list(violations)
+        super().__init__(f"{len(failed)} index/trigger(s) not recreated, first: {failed[0][0]} ({failed[0][1]})")
+
+DEFAULT_TEMPLATE_DIR = ".dataforge_cache/templates"
+DEFAULT_CATALOG_DIR = ".dataforge_cache/catalog"
+
+# Every table's columns and foreign keys in one statement, in sqlite_master order:
+# (table, kind 0 = column / 1 = foreign key, cid / fk id, name / from, type / parent, notnull / to, dflt_value, pk / seq)
+CATALOG_QUERY = """
+    SELECT m.name, 0, c.cid, c.name, c.type, c."notnull", c.dflt_value, c.pk, m.rowid
+    FROM sqlite_master m, pragma_table_info(m.name) c
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+    UNION ALL
+    SELECT m.name, 1, f.id, f."from", f."table", f."to", NULL, f.seq, m.rowid
+    FROM sqlite_master m, pragma_foreign_key_list(m.name) f
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+    ORDER BY 9, 2, 3, 8
+"""
+
+# Changes with any schema change. The object count and DDL size tell apart two
+# files (e.g. swapped-in templates) that happen to share a schema_version.
+SCHEMA_KEY_QUERY = """
+    SELECT (SELECT schema_version FROM pragma_schema_version), COUNT(*), TOTAL(LENGTH(sql)) FROM sqlite_master
+"""
+
+def connect(path, **kwargs):
+    """sqlite3.connect that also opens file: URIs (the in-memory staging database of a StagedBuild)."""
+    return sqlite3.connect(path, uri=path.startswith('file:'), **kwargs)
+
+class Catalog:
+    """
+    Snapshot of a database's schema, read once instead of per table.
+    columns: {table: [(cid, name, type, notnull, dflt_value, pk)]}, as PRAGMA table_info
+    foreign_keys: {table: [(column, parent_table, parent_column)]}
+    key: what the snapshot was taken at, to tell whether it is still current
+    source: absolute path of the database file, in a cached copy (see DBConnector.prune_catalogs)
+    """
+    def __init__(self, columns, foreign_keys, key=None, source=None):
+        self.columns = columns
+        self.foreign_keys = foreign_keys
+        self.key = key
+        self.source = source
+
+    @property
+    def tables(self):
+        return list(self.columns)
+
+    @classmethod
+    def from_rows(cls, rows, key=None):
+        """Builds the snapshot from CATALOG_QUERY's rows."""
+        columns, foreign_keys = {}, {}
+        for table, kind, cid, name, col_type, notnull, default, pk, _ in rows:
+            columns.setdefault(table, [])
+            foreign_keys.setdefault(table, [])
+            if kind == 0:
+                columns[table].append((cid, name, col_type, notnull, default, pk))
+            else:
+                foreign_keys[table].append((name, col_type, notnull))
+        return cls(columns, foreign_keys, key)
+
+    def to_json(self):
+        return json.dumps({'key': self.key, 'source': self.source,
+                           'columns': self.columns, 'foreign_keys': self.foreign_keys})
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        return cls({t: [tuple(c) for c in cols] for t, cols in data['columns'].items()},
+                   {t: [tuple(fk) for fk in fks] for t, fks in data['foreign_keys'].items()},
+                   data['key'], data.get('source'))
+
+class LoadSession:
+    """
+    Commit policy and counters shared by the backends' bulk-load sessions.
+    Rows are committed every `commit_every` rows, and once more when a table
+    ends (see end_table). Subclasses write with insert(), after mark(), and
+    call written(); last_key() and delete_after() let discard() take a failed
+    table's rows out again.
+    row_counts: a RowCounts that gets each table's rows as they commit
+    """
+    def __init__(self, commit_every=0, row_counts=None):
+        self.commit_every = commit_every
+        self.row_counts = row_counts
+        self.pending = {} # rows per table since the last commit
+        self.committed_rows = {} # rows per table committed by this session
+        self.baselines = {} # table -> its last key before this session wrote to it
+        self.statements = {}
+        self.uncommitted = 0
+        self.rows_written = 0
+        self.rows_committed = 0
+        self.commits = 0
+        self.last_commit = time.time()
+        self.suspended = [] # schema objects dropped by suspend_constraints
+
+    def written(self, table_name, rows):
+        self.pending[table_name] = self.pending.get(table_name, 0) + rows
+        self.uncommitted += rows
+        self.rows_written += rows
+        if self.commit_every and self.uncommitted >= self.commit_every:
+            self.commit()
+        return rows
+
+    def end_table(self, table_name):
+        """Called when a table is fully written; commits it so its children can read its keys."""
+        self.commit()
+
+    def mark(self, table_name):
+        """Records where the table's rows of this session start, before its first write."""
+        if table_name not in self.baselines:
+            self.baselines[table_name] = self.last_key(table_name)
+
+    def discard(self, table_name):
+        """
+        Deletes the rows this session wrote to the table, committed or not,
+        and takes them off the row counts; returns how many were deleted.
+        Does nothing for a table without a key to tell its new rows apart.
+        """
+        baseline = self.baselines.pop(table_name, None)
+        if baseline is None:
+            return 0
+        deleted = self.delete_after(table_name, *baseline)
+        self.uncommitted -= self.pending.pop(table_name, 0)
+        committed = self.committed_rows.pop(table_name, 0)
+        if committed:
+            self.pending[table_name] = -committed # Applied to the row counts at the next commit
+        return deleted
+
+    def commit(self):
+        if self.row_counts is None:
+            self.conn.commit()
+        else:
+            with self.row_counts.lock:
+                self.conn.commit()
+                self.row_counts.committed(self.pending)
+        for table_name, rows in self.pending.items():
+            self.committed_rows[table_name] = self.committed_rows.get(table_name, 0) + rows
+        self.pending = {}
+        self.rows_committed += self.uncommitted
+        self.uncommitted = 0
+        self.commits += 1
+        self.last_commit = time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class BulkLoadSession(LoadSession):
+    """
+    SQLite bulk load: one connection held for a whole load, with load-time
+    PRAGMAs that close() puts back after the final commit.
+    The INSERT for a table is built once, so sqlite3 reuses its prepared
+    statement for every batch.
+    """
+    def __init__(self, db_path, commit_every=0, pragmas=None, row_counts=None):
+        super().__init__(commit_every, row_counts)
+        # Tables of one DAG generation are written from several threads (serialized by the caller)
+        self.conn = connect(db_path, check_same_thread=False, cached_statements=256)
+
+        self.saved = {}
+        for name, value in (pragmas if pragmas is not None else LOAD_PRAGMAS).items():
+            current = self.conn.execute(f"PRAGMA {name}").fetchone()
+            if current is None:
+                continue # Not applicable here (mmap_size on an in-memory database)
+            self.saved[name] = current[0]
+            self.conn.execute(f"PRAGMA {name} = {value}")
+
+    def statement(self, table_name, columns):
+        key = (table_name, tuple(columns))
+        query = self.statements.get(key)
+        if query is None:
+            placeholders = ', '.join(['?' for _ in columns])
+            query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+            self.statements[key] = query
+        return query
+
+    def insert(self, table_name, columns, data_chunk):
+        """Inserts a batch inside the open transaction; returns the row count."""
+        self.mark(table_name)
+        self.conn.executemany(self.statement(table_name, columns), data_chunk)
+        return self.written(table_name, len(data_chunk))
+
+    def last_key(self, table_name):
+        """(key column, its current maximum): the rowid, or None for a WITHOUT ROWID table."""
+        try:
+            return ('rowid', self.conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table_name}").fetchone()[0])
+        except sqlite3.OperationalError:
+            return None
+
+    def delete_after(self, table_name, key, last):
+        return self.conn.execute(f"DELETE FROM {table_name} WHERE {key} > ?", (last,)).rowcount
+
+    def merge(self, shards, table_name, columns):
+        """Copies the table's rows from every shard into this database; returns the row count."""
+        self.mark(table_name)
+        self.commit() # ATTACH is not allowed inside a transaction
+        cols = ', '.join(columns)
+        merged = 0
+        for path in shards.paths():
+            self.conn.execute("ATTACH DATABASE ? AS shard", (path,))
+            try:
+                if self.conn.execute("SELECT 1 FROM shard.sqlite_master WHERE type = 'table' AND name = ?",
+                                     (table_name,)).fetchone():
+                    rows = self.conn.execute(
+                        f"INSERT INTO main.{table_name} ({cols}) SELECT {cols} FROM shard.{table_name}").rowcount
+                    merged += rows
+                    self.written(table_name, rows)
+                self.commit()
+            finally:
+                self.conn.execute("DETACH DATABASE shard")
+        return merged
+
+    def suspend_constraints(self, tables):
+        """
+        Large-load mode: drops the tables' indexes and triggers, keeping their
+        SQL from sqlite_master, and turns foreign-key enforcement off until
+        restore_constraints(). Works on any schema, not only DOMAINS.
+        Unique indexes stay, so duplicates fail as they are written instead
+        of when the index is rebuilt. Triggers do not fire for the rows
+        loaded meanwhile.
+        """
+        self.commit()
+        marks = ', '.join('?' for _ in tables)
+        objects = self.conn.execute(
+            f"SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') "
+            f"AND tbl_name IN ({marks}) AND sql IS NOT NULL", list(tables)
+        ).fetchall()
+        for kind, name, sql in objects:
+            if kind == 'index' and sql.lstrip().upper().startswith('CREATE UNIQUE'):
+                continue
+            self.conn.execute(f'DROP {kind.upper()} IF EXISTS "{name}"')
+            self.suspended.append(sql)
+        self.suspended_tables = list(tables)
+        self.saved_foreign_keys = self.conn.execute("PRAGMA foreign_keys").fetchone()[0]
+        self.conn.execute("PRAGMA foreign_keys = OFF")
+        self.conn.commit()
+
+    def restore_constraints(self):
+        """
+        Rebuilds the dropped indexes (one sort each instead of per-row
+        updates) and triggers, restores foreign-key enforcement and checks
+        the loaded tables' foreign keys in one pass.
+        Returns the violations as (table, rowid, parent, fk_id) rows. Every
+        object is tried; those that fail raise RestoreError with their SQL
+        once the others are rebuilt and checked.
+        """
+        self.commit()
+        failed = []
+        for sql in self.suspended:
+            try:
+                self.conn.execute(sql)
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                failed.append((sql, str(e)))
+        self.suspended = []
+        tables, self.suspended_tables = getattr(self, 'suspended_tables', []), []
+        if getattr(self, 'saved_foreign_keys', None) is not None:
+            self.conn.execute(f"PRAGMA foreign_keys = {self.saved_foreign_keys}")
+        violations = []
+        for table in tables:
+            violations += self.conn.execute(f"PRAGMA foreign_key_check({table})").fetchall()
+        if failed:
+            raise RestoreError(failed, violations)
+        return violations
+
+    def close(self):
+        """Commits what was written and restores the connection's previous settings."""
+        if self.conn is None:
+            return
+        try:
+            self.commit()
+            for name, value in self.saved.items():
+                try:
+                    self.conn.execute(f"PRAGMA {name} = {value}")
+                except sqlite3.OperationalError:
+                    pass # Leaving WAL needs exclusive access; the file just stays in WAL mode
+        finally:
+            self.conn.close()
+            self.conn = None
+
+class BatchWriter:
+    """
+    Writer stage on its own thread, in front of a bulk-load session.
+    put() hands a batch over and only blocks while `max_buffered` batches
+    are already waiting. The thread merges consecutive batches of the same
+    table into one executemany of up to `group_rows` rows, and commits
+    every `commit_seconds` on top of the session's own row interval / per
+    table commits. A failed write fails only its table: it is re-raised by
+    the table's next put(), end_table() or merge(), and abort_table() then
+    deletes the table's rows. A failed commit stops the writer and is
+    re-raised by every call, close() included.
+    """
+    def __init__(self, session, max_buffered=8, group_rows=5000, commit_seconds=0):
+        self.session = session
+        self.buffer = queue.Queue(maxsize=max_buffered)
+        self.group_rows = group_rows
+        self.commit_seconds = commit_seconds
+        self.error = None
+        self.failed = {} # table -> the error of its failed write
+        self.carry = deque() # item read ahead while grouping
+
+        # Metrics
+        self.batches = 0
+        self.writes = 0
+        self.buffer_peak = 0
+        self.stall_seconds = 0.0 # producers blocked on a full buffer
+        self.busy_seconds = 0.0 # writer inside executemany/commit
+
+        self.thread = threading.Thread(target=self.run, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def check(self, table_name=None):
+        if self.error is not None:
+            raise self.error
+        if table_name in self.failed:
+            raise self.failed[table_name]
+
+    def put(self, table_name, columns, data_chunk):
+        """Queues a batch for writing; returns the seconds spent waiting for buffer space."""
+        self.check(table_name)
+        start = time.perf_counter()
+        self.buffer.put((table_name, tuple(columns), data_chunk))
+        stalled = time.perf_counter() - start
+        self.stall_seconds += stalled
+        self.buffer_peak = max(self.buffer_peak, self.buffer.qsize())
+        return stalled
+
+    def end_table(self, table_name):
+        """Waits until every batch of the table is written and, in per-table mode, committed."""
+        done = threading.Event()
+        self.buffer.put(('end', table_name, done))
+        done.wait()
+        self.check(table_name)
+
+    def merge(self, shards, table_name, columns):
+        """Has the writer thread merge the table's shards into the database; returns the rows merged."""
+        done = threading.Event()
+        result = []
+        self.buffer.put(('merge', (shards, table_name, tuple(columns), result), done))
+        done.wait()
+        self.check(table_name)
+        return result[0]
+
+    def abort_table(self, table_name):
+        """Deletes and commits away the rows of a failed table once its queued batches are drained."""
+        done = threading.Event()
+        self.buffer.put(('abort', table_name, done))
+        done.wait()
+
+    def next_item(self):
+        if self.carry:
+            return self.carry.popleft()
+        timeout = None
+        if self.commit_seconds and self.session.uncommitted:
+            timeout = max(0.0, self.session.last_commit + self.commit_seconds - time.time())
+        try:
+            return self.buffer.get(timeout=timeout)
+        except queue.Empty:
+            return 'tick'
+
+    def run(self):
+        while True:
+            item = self.next_item()
+            if item is None:
+                return
+            try:
+                if item == 'tick':
+                    pass
+                elif item[0] in ('end', 'merge', 'abort'):
+                    try:
+                        self.control(item)
+                    finally:
+                        item[2].set() # The caller re-raises a failure through check()
+                    continue
+                elif self.error is None and item[0] not in self.failed:
+                    try:
+                        self.write_group(item)
+                    except Exception as e:
+                        self.failed[item[0]] = e # The table's later batches are drained but not written
+                if self.commit_seconds and self.session.uncommitted and \
+                        time.time() - self.session.last_commit >= self.commit_seconds:
+                    self.session.commit()
+            except Exception as e:
+                self.error = e # Nothing is written after a failed commit
+
+    def control(self, item):
+        kind, arg = item[0], item[1]
+        if self.error is not None:
+            return
+        if kind == 'abort':
+            self.failed.pop(arg, None)
+            self.session.discard(arg)
+            self.session.commit()
+        elif kind == 'end' and arg not in self.failed:
+            self.session.end_table(arg)
+        elif kind == 'merge':
+            shards, table_name, columns, result = arg
+            try:
+                result.append(self.session.merge(shards, table_name, columns))
+            except Exception as e:
+                self.failed[table_name] = e
+
+    def write_group(self, item):
+        """Writes item plus the batches queued right behind it for the same table."""
+        table_name, columns, rows = item
+        self.batches += 1
+        rows = list(rows)
+        while len(rows) < self.group_rows:
+            try:
+                nxt = self.buffer.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is None or nxt[0] != table_name or nxt[1] != columns:
+                self.carry.append(nxt)
+                break
+            rows.extend(nxt[2])
+            self.batches += 1
+        start = time.perf_counter()
+        self.session.insert(table_name, columns, rows)
+        self.busy_seconds += time.perf_counter() - start
+        self.writes += 1
+
+    def close(self):
+        """Writes what is left, stops the thread and re-raises a failed commit."""
+        if self.thread.is_alive():
+            self.buffer.put(None)
+            self.thread.join()
+        self.check()
+
+    def metrics(self):
+        return {
+            'batches': self.batches,
+            'writes': self.writes,
+            'rows_written': self.session.rows_written,
+            'rows_committed': self.session.rows_committed,
+            'commits': self.session.commits,
+            'buffered': self.buffer.qsize(),
+            'buffer_peak': self.buffer_peak,
+            'stall_seconds': self.stall_seconds,
+            'busy_seconds': self.busy_seconds,
+        }
+
+    def summary(self):
+        m = self.metrics()
+        return (f"{m['rows_committed']} rows committed in {m['commits']} commits, "
+                f"{m['batches']} batches in {m['writes']} writes, buffer peak {m['buffer_peak']}, "
+                f"producers stalled {m['stall_seconds']:.2f}s, writer busy {m['busy_seconds']:.2f}s")
+
+# Shard connections of the worker processes: {(pid, directory): connection}
+_shard_conns = {}
+
+class Shards:
+    """
+    Sharded write mode (load.shards). Every worker process writes its
+    batches to its own SQLite file in `directory`, so inserts run in
+    parallel instead of queueing for the single writer of the main file.
+    The parent assigns each batch an id range, so merge() (ATTACH +
+    INSERT ... SELECT, see BulkLoadSession.merge) copies rows into the main
+    database with their primary and foreign keys intact.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def connection(self):
+        key = (os.getpid(), self.directory)
+        conn = _shard_conns.get(key)
+        if conn is None:
+            # Shards of earlier runs are gone; drop their connections
+            for old in [k for k in _shard_conns if k[0] == key[0] and not os.path.isdir(k[1])]:
+                _shard_conns.pop(old).close()
+            conn = sqlite3.connect(os.path.join(self.directory, f"shard-{os.getpid()}.db"), timeout=30)
+            conn.execute("PRAGMA journal_mode = WAL") # The parent merges while workers keep writing
+            conn.execute("PRAGMA synchronous = OFF")
+            _shard_conns[key] = conn
+        return conn
+
+    def insert(self, table_name, columns, rows):
+        """Appends rows to this process's shard; returns the row count."""
+        conn = self.connection()
+        cols = ', '.join(columns)
+        # Untyped columns keep the values as given; the main table's types apply on merge
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({cols})")
+        conn.executemany(f"INSERT INTO {table_name} ({cols}) VALUES ({', '.join('?' for _ in columns)})", rows)
+        conn.commit()
+        return len(rows)
+
+    def paths(self):
+        return sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                      if name.endswith('.db'))
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+class StagedBuild:
+    """
+    Builds a SQLite database away from its file, then swaps it in whole.
+
+    where: 'memory' (SQLite's memdb VFS, shared by every connection of this
+    process) or a directory such as a tmpfs mount. open() copies the current
+    database there and points the connector at the copy; commit() copies the
+    result with the online backup API into a temp file next to the target
+    and os.replace()s the target with it. Until then the target is
+    untouched, so a crash or an error never leaves it half written.
+
+        with db.staged_build('memory'):
+            ...  # seed through db as usual
+    """
+    def __init__(self, db, where='memory'):
+        self.db = db
+        self.target = db.db_path
+        self.where = where
+        self.path = None
+        self.anchor = None
+        self.committed = False
+
+    def open(self):
+        if self.where == 'memory':
+            self.path = f"file:/dataforge-{os.getpid()}-{id(self)}?vfs=memdb"
+        else:
+            fd, self.path = tempfile.mkstemp(prefix='dataforge-build-', suffix='.db', dir=self.where)
+            os.close(fd)
+        # Held open for the whole build: an in-memory database lives as long as a connection to it
+        self.anchor = connect(self.path, check_same_thread=False)
+        if os.path.exists(self.target):
+            with closing(sqlite3.connect(self.target)) as source:
+                source.backup(self.anchor)
+        self.db.db_path = self.path
+        self.db.staged_path = self.path
+        return self
+
+    def commit(self):
+        """Copies the staged database over the target in one atomic rename."""
+        directory = os.path.dirname(os.path.abspath(self.target))
+        fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(self.target)}.", suffix='.tmp', dir=directory)
+        os.close(fd)
+        try:
+            with closing(sqlite3.connect(tmp)) as dest:
+                self.anchor.backup(dest)
+            with open(tmp, 'rb+') as f:
+                os.fsync(f.fileno())
+            if os.path.exists(self.target + '-wal'):
+                # Fold the old file's WAL into it first, so it cannot be replayed onto the new one
+                with closing(sqlite3.connect(self.target)) as old:
+                    old.execute("PRAGMA journal_mode = DELETE")
+            os.replace(tmp, self.target)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        if hasattr(os, 'O_DIRECTORY'):
+            # Make the rename itself durable
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        self.committed = True
+
+    def close(self):
+        """Points the connector back at the target and discards the staging copy."""
+        self.db.db_path = self.target
+        self.db.staged_path = None
+        self.db.catalogs.pop(self.path, None)
+        if not self.committed:
+            self.db.row_counts.reset() # They counted rows the target never got
+        if self.anchor is not None:
+            self.anchor.close()
+            self.anchor = None
+        if self.where != 'memory' and self.path:
+            for suffix in ('', '-wal', '-shm', '-journal'):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.commit()
+        finally:
+            self.close()
+
+def create_connector(config):
+    """The connector for `database.backend` in settings.yaml: sqlite (default) or postgres."""
+    backend = (config.get('database') or {}).get('backend', 'sqlite')
+    if backend == 'postgres':
+        from core.pg_connector import PostgresConnector # needs psycopg
+        return PostgresConnector(config)
+    if backend != 'sqlite':
+        raise ValueError(f"Unknown database backend: {backend}")
+    return DBConnector(config)
 
 class DBConnector:
+    """
+    SQLite backend, and the interface every backend implements:
+    init_domain, execute_query, catalog, fetch_tables, table_columns, foreign_keys, estimate_rows,
+    bulk_insert, bulk_load (a LoadSession), writer, staged_build and shards.
+    """
+    dialect = 'sqlite'
+
     DOMAINS = {
         "E-commerce": [
             "CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, email TEXT, city TEXT, signup_date TEXT)",
@@ -28,15 +660,32 @@ class DBConnector:
 
     def __init__(self, config):
         self.config = config.get('database', {})
+        self.load_config = config.get('load') or {}
         self.db_path = 'dataforge.db'
         # Don't auto-init anymore, let the TUI decide
+        self.catalogs = {} # {db_path: Catalog}
+        self.staged_path = None # the copy an open StagedBuild points db_path at
+        self.row_counts = RowCounts(self)
 
     def init_domain(self, domain_name):
-        """Reset and initialize a specific domain schema."""
+        """
+        Reset and initialize a specific domain schema.
+        The database file is replaced by a copy of the domain's empty
+        template, so the reset costs the same however much data it held.
+        """
         if domain_name not in self.DOMAINS:
             return False
-            
-        with self.get_connection() as conn:
+
+        # A staged in-memory build has no file to swap
+        if not self.db_path.startswith('file:'):
+            try:
+                self.swap_in(self.domain_template(domain_name))
+                self.row_counts.reset()
+                return True
+            except PermissionError:
+                pass # Windows won't replace a file another process has open; drop the tables instead
+
+        with closing(self.get_connection()) as conn, conn:
             cur = conn.cursor()
             # Drop existing tables
             cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
@@ -48,38 +697,199 @@ class DBConnector:
             for sql in self.DOMAINS[domain_name]:
                 cur.execute(sql)
             conn.commit()
+        self.row_counts.reset()
         return True
 
+    def domain_template(self, domain_name):
+        """
+        Path of the domain's empty template database, built on first use.
+        Its name carries a hash of the DDL, so editing DOMAINS builds a new
+        one (and removes the outdated file).
+        """
+        ddl = self.DOMAINS[domain_name]
+        digest = hashlib.sha256("\n".join(ddl).encode()).hexdigest()[:16]
+        directory = self.config.get('template_dir', DEFAULT_TEMPLATE_DIR)
+        slug = re.sub(r'\W+', '_', domain_name).lower()
+        path = os.path.join(directory, f"{slug}-{digest}.db")
+        if os.path.exists(path):
+            return path
+
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=f".{slug}.", suffix='.tmp', dir=directory)
+        os.close(fd)
+        try:
+            with closing(sqlite3.connect(tmp)) as conn, conn:
+                for sql in ddl:
+                    conn.execute(sql)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        for name in os.listdir(directory):
+            if re.fullmatch(rf"{slug}-[0-9a-f]{{16}}\.db", name) and name != os.path.basename(path):
+                os.remove(os.path.join(directory, name))
+        return path
+
+    def swap_in(self, source):
+        """Replaces the database file with a copy of `source`, in one rename."""
+        directory = os.path.dirname(os.path.abspath(self.db_path))
+        fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(self.db_path)}.", suffix='.tmp', dir=directory)
+        os.close(fd)
+        try:
+            shutil.copyfile(source, tmp)
+            # The old file's journal must not be replayed onto the new one
+            for suffix in ('-wal', '-shm', '-journal'):
+                if os.path.exists(self.db_path + suffix):
+                    os.remove(self.db_path + suffix)
+            os.replace(tmp, self.db_path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
     def get_connection(self):
         """Simple connection factory."""
-        return sqlite3.connect(self.db_path)
+        return connect(self.db_path)
 
     def bulk_insert(self, table_name, columns, data_chunk):
         """
         Bulk insert using executemany for SQLite.
         """
         try:
-            with self.get_connection() as conn:
+            with closing(self.get_connection()) as conn, conn:
                 cur = conn.cursor()
                 placeholders = ', '.join(['?' for _ in columns])
                 query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
                 cur.executemany(query, data_chunk)
-                conn.commit()
+                with self.row_counts.lock:
+                    conn.commit()
+                    self.row_counts.committed({table_name: len(data_chunk)})
                 return len(data_chunk)
         except Exception:
             return 0
     
+    def bulk_load(self, commit_every=None, pragmas=None):
+        """
+        Opens a bulk-load session on this database (see BulkLoadSession).
+        Defaults come from the `load` section of the config.
+        """
+        settings = self.load_config
+        if commit_every is None:
+            commit_every = settings.get('commit_every', 0)
+        if pragmas is None:
+            pragmas = dict(LOAD_PRAGMAS, **(settings.get('pragmas') or {}))
+        return BulkLoadSession(self.db_path, commit_every, pragmas, self.row_counts)
+
+    def staged_build(self, where=None):
+        """
+        A StagedBuild for `load.build` (memory, or a directory such as
+        /dev/shm), or None when it is 'direct' and loads write in place.
+        """
+        where = where or self.load_config.get('build', 'direct')
+        if where == 'direct':
+            return None
+        return StagedBuild(self, where)
+
+    def shards(self):
+        """A fresh Shards directory for a sharded load (under load.shard_dir, else the temp dir)."""
+        return Shards(tempfile.mkdtemp(prefix='dataforge-shards-', dir=self.load_config.get('shard_dir')))
+
+    def writer(self, session):
+        """Starts a BatchWriter thread for a bulk-load session, configured from the `load` section."""
+        settings = self.load_config
+        return BatchWriter(session, settings.get('writer_buffer', 8), settings.get('group_rows', 5000),
+                           settings.get('commit_seconds', 0))
+
+    def catalog(self):
+        """
+        The schema snapshot (see Catalog). Each call checks PRAGMA
+        schema_version with one small query; the snapshot itself is reused
+        from memory or from its copy under database.catalog_dir, and only
+        reloaded (with CATALOG_QUERY) when the schema changed. A StagedBuild's
+        copy lives for one run and is not cached on disk.
+        """
+        with closing(self.get_connection()) as conn:
+            key = list(conn.execute(SCHEMA_KEY_QUERY).fetchone())
+        in_memory = self.db_path.startswith('file:')
+        if not in_memory:
+            key.append(os.stat(self.db_path).st_ino) # A swapped-in file is another database
+
+        catalog = self.catalogs.get(self.db_path)
+        if catalog is not None and catalog.key == key:
+            return catalog
+
+        cache_path = None
+        if not in_memory and self.db_path != self.staged_path:
+            directory = self.config.get('catalog_dir', DEFAULT_CATALOG_DIR)
+            name = hashlib.sha256(os.path.abspath(self.db_path).encode()).hexdigest()[:16]
+            cache_path = os.path.join(directory, f"{name}.json")
+            try:
+                with open(cache_path, encoding='utf-8') as f:
+                    catalog = Catalog.from_json(f.read())
+            except (OSError, ValueError, KeyError):
+                catalog = None
+
+        if catalog is None or catalog.key != key:
+            with closing(self.get_connection()) as conn:
+                catalog = Catalog.from_rows(conn.execute(CATALOG_QUERY).fetchall(), key)
+            if cache_path:
+                catalog.source = os.path.abspath(self.db_path)
+                # Per thread: seed_tables reads the catalog from several threads at once
+                tmp = f"{cache_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+                try:
+                    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                    with open(tmp, 'w', encoding='utf-8') as f:
+                        f.write(catalog.to_json())
+                    os.replace(tmp, cache_path)
+                    self.prune_catalogs(directory)
+                except OSError:
+                    pass # Only a cache; the next call reloads it
+        self.catalogs[self.db_path] = catalog
+        return catalog
+
+    def prune_catalogs(self, directory):
+        """Removes the cached snapshots under directory whose database file no longer exists."""
+        for name in os.listdir(directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                with open(path, encoding='utf-8') as f:
+                    source = json.loads(f.read()).get('source')
+                if not source or not os.path.exists(source):
+                    os.remove(path)
+            except (OSError, ValueError, AttributeError):
+                pass # Being replaced by another thread, or already gone
+
     def fetch_tables(self):
         """Retrieve all table names from SQLite."""
-        query = "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';"
-        with self.get_connection() as conn:
-            cur = conn.cursor()
-            cur.execute(query)
-            return [row[0] for row in cur.fetchall()]
+        return self.catalog().tables
+
+    def table_columns(self, table_name):
+        """(cid, name, type, notnull, dflt_value, pk) per column, as returned by PRAGMA table_info."""
+        return self.catalog().columns.get(table_name, [])
+
+    def foreign_keys(self, table_name):
+        """(column, parent_table, parent_column) per declared foreign key."""
+        return self.catalog().foreign_keys.get(table_name, [])
+
+    def estimate_rows(self, table_name):
+        """
+        Cheap row count for RowCounts: MAX(rowid), exact for tables only
+        ever appended to, else the count ANALYZE left in sqlite_stat1.
+        """
+        try:
+            return self.execute_query(f"SELECT COALESCE(MAX(rowid), 0) FROM {table_name}")[0][0]
+        except sqlite3.OperationalError:
+            pass # WITHOUT ROWID table
+        try:
+            rows = self.execute_query("SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (table_name,))
+        except sqlite3.OperationalError:
+            return 0 # Never analyzed
+        return int(rows[0][0].split()[0]) if rows else 0
 
-    def execute_query(self, query):
-        with self.get_connection() as conn:
+    def execute_query(self, query, params=()):
+        with closing(self.get_connection()) as conn, conn:
             cur = conn.cursor()
-            cur.execute(query)
+            cur.execute(query, params)
             if cur.description:
                 return cur.fetchall()
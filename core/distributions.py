@@ -0,0 +1,226 @@
+import random
+
+import numpy as np
+
+# Per-column distributions, configured in settings.yaml under `distributions`
+# as {"table.column": {"kind": ..., params}}:
+#   zipf      s=1.1            popular products, hot sensors (skew over options/keys)
+#   pareto    alpha=1.2        order counts per customer (skew over options/keys),
+#                              or a heavy-tailed value with `scale` for numeric columns
+#   weighted  weights={v: w}   weighted categorical, missing values weigh 1
+#   normal    mean, std        numeric columns
+#   lognormal mean, sigma      numeric columns (amounts, balances)
+# Numeric kinds accept optional min/max to clip to.
+
+SKEW_KINDS = ('zipf', 'pareto', 'weighted')
+NUMERIC_KINDS = ('normal', 'lognormal', 'pareto')
+
+# Above this many options/keys, weights are kept per bucket of neighbouring keys
+MAX_ALIAS_SIZE = 65536
+
+# Alias tables are rebuilt per process from their spec instead of being pickled with every batch
+_ALIAS_CACHE = {}
+
+class AliasTable:
+    """Walker/Vose alias table: O(1) draws from a fixed discrete distribution."""
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        n = len(weights)
+        prob = weights * n / weights.sum()
+        alias = np.zeros(n, dtype=np.int64)
+        small = [i for i in range(n) if prob[i] < 1.0]
+        large = [i for i in range(n) if prob[i] >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            alias[s] = l
+            prob[l] -= 1.0 - prob[s]
+            (small if prob[l] < 1.0 else large).append(l)
+        for i in small + large:
+            prob[i] = 1.0
+        self.prob = prob
+        self.alias = alias
+
+    def __len__(self):
+        return len(self.prob)
+
+    def sample(self):
+        i = random.randrange(len(self.prob))
+        return i if random.random() < self.prob[i] else int(self.alias[i])
+
+    def sample_many(self, n, rng):
+        i = rng.integers(0, len(self.prob), n)
+        return np.where(rng.random(n) < self.prob[i], i, self.alias[i])
+
+def skew_weights(spec, n, bucket_width=1, seed=0):
+    """Weights of n positions (or buckets of bucket_width positions) for a skew spec."""
+    kind = spec['kind']
+    if kind == 'zipf':
+        s = spec.get('s', 1.1)
+        if bucket_width == 1:
+            return np.arange(1, n + 1, dtype=np.float64) ** -s
+        # Mass of each bucket of ranks, from the integral of x^-s
+        edges = np.arange(n + 1, dtype=np.float64) * bucket_width + 0.5
+        if s == 1:
+            return np.diff(np.log(edges))
+        return np.diff(edges ** (1 - s)) / (1 - s)
+    if kind == 'pareto':
+        # Each key gets a heavy-tailed activity level; a few keys get most of the rows
+        rng = np.random.default_rng(seed)
+        return rng.pareto(spec.get('alpha', 1.2), n) + 1
+    raise ValueError(f"Unknown skew distribution: {kind}")
+
+def get_alias_table(spec, n, bucket_width, seed):
+    key = (repr(sorted(spec.items())), n, bucket_width, seed)
+    table = _ALIAS_CACHE.get(key)
+    if table is None:
+        table = AliasTable(skew_weights(spec, n, bucket_width, seed))
+        _ALIAS_CACHE[key] = table
+    return table
+
+class SkewedPositions:
+    """
+    Draws positions 0..size-1 with a zipf/pareto skew (position 0 is the hottest).
+    Large sizes are split into MAX_ALIAS_SIZE buckets, uniform inside a bucket.
+    Only the spec is pickled; each process builds the alias table once.
+    """
+    def __init__(self, spec, size, seed=None):
+        self.spec = spec
+        self.size = size
+        self.bucket_width = -(-size // MAX_ALIAS_SIZE) if size > MAX_ALIAS_SIZE else 1
+        self.buckets = -(-size // self.bucket_width)
+        self.seed = seed if seed is not None else random.getrandbits(32)
+
+    @property
+    def table(self):
+        return get_alias_table(self.spec, self.buckets, self.bucket_width, self.seed)
+
+    def sample(self):
+        pos = self.table.sample() * self.bucket_width
+        if self.bucket_width > 1:
+            pos += random.randrange(self.bucket_width)
+        return min(pos, self.size - 1)
+
+    def sample_many(self, n, rng):
+        pos = self.table.sample_many(n, rng) * self.bucket_width
+        if self.bucket_width > 1:
+            pos += rng.integers(0, self.bucket_width, n)
+        return np.minimum(pos, self.size - 1)
+
+class WeightedChoice:
+    """Weighted categorical choice over a list of options."""
+    def __init__(self, options, weights):
+        self.options = np.empty(len(options), dtype=object)
+        self.options[:] = options
+        self.table = AliasTable([weights.get(o, 1) for o in options])
+
+    def __call__(self):
+        return self.options[self.table.sample()]
+
+    def batch(self, n, rng):
+        return self.options[self.table.sample_many(n, rng)]
+
+class SkewedChoice:
+    """zipf/pareto choice over a list of options (first options are the most frequent)."""
+    def __init__(self, options, spec):
+        self.options = np.empty(len(options), dtype=object)
+        self.options[:] = options
+        self.positions = SkewedPositions(spec, len(options))
+
+    def __call__(self):
+        return self.options[self.positions.sample()]
+
+    def batch(self, n, rng):
+        return self.options[self.positions.sample_many(n, rng)]
+
+class SkewedKey:
+    """zipf/pareto draw over the keys of a KeyIndex (hot customers, popular products)."""
+    def __init__(self, index, spec):
+        self.index = index
+        self.positions = SkewedPositions(spec, len(index))
+
+    def __call__(self):
+        key = self.index.key_at(np.array([self.positions.sample()]))[0]
+        return key.item() if isinstance(key, np.generic) else key # text keys come back as str
+
+    def batch(self, n, rng):
+        return self.index.key_at(self.positions.sample_many(n, rng))
+
+class NumericDistribution:
+    """normal / lognormal / pareto values, clipped to the spec's min/max and rounded (or cast to int)."""
+    def __init__(self, spec, digits=2, integer=False):
+        self.spec = spec
+        self.low = spec.get('min')
+        self.high = spec.get('max')
+        self.digits = digits
+        self.integer = integer
+
+    def clip(self, values):
+        if self.low is not None or self.high is not None:
+            values = np.clip(values, self.low, self.high)
+        if self.integer:
+            return np.rint(values).astype(np.int64)
+        return np.round(values, self.digits)
+
+    def draw(self, n, rng):
+        kind = self.spec['kind']
+        if kind == 'normal':
+            values = rng.normal(self.spec.get('mean', 0.0), self.spec.get('std', 1.0), n)
+        elif kind == 'lognormal':
+            values = rng.lognormal(self.spec.get('mean', 0.0), self.spec.get('sigma', 1.0), n)
+        elif kind == 'pareto':
+            values = (rng.pareto(self.spec.get('alpha', 1.2), n) + 1) * self.spec.get('scale', 1.0)
+        else:
+            raise ValueError(f"Unknown numeric distribution: {kind}")
+        return self.clip(values)
+
+    def __call__(self):
+        kind = self.spec['kind']
+        if kind == 'normal':
+            value = random.gauss(self.spec.get('mean', 0.0), self.spec.get('std', 1.0))
+        elif kind == 'lognormal':
+            value = random.lognormvariate(self.spec.get('mean', 0.0), self.spec.get('sigma', 1.0))
+        elif kind == 'pareto':
+            value = random.paretovariate(self.spec.get('alpha', 1.2)) * self.spec.get('scale', 1.0)
+        else:
+            raise ValueError(f"Unknown numeric distribution: {kind}")
+        return self.clip(np.array([value])).tolist()[0]
+
+    def batch(self, n, rng):
+        return self.draw(n, rng)
+
+def skewed_options(spec, options):
+    """Choice producer over options for a skew spec (zipf, pareto or weighted)."""
+    if spec['kind'] == 'weighted':
+        return WeightedChoice(options, spec.get('weights', {}))
+    return SkewedChoice(options, spec)
+
+class Picker:
+    """
+    Row-at-a-time helper for the CSV generator: pick(key, options) follows the
+    configured distribution for key and falls back to random.choice.
+    Samplers are built once per key, from the options of its first pick; a
+    key names one column, so later picks pass the same options.
+    """
+    def __init__(self, distributions=None):
+        self.distributions = distributions or {}
+        self.samplers = {}
+
+    def pick(self, key, options):
+        spec = self.distributions.get(key)
+        if not spec or spec['kind'] not in SKEW_KINDS:
+            return random.choice(options)
+        sampler = self.samplers.get(key)
+        if sampler is None:
+            sampler = skewed_options(spec, options)
+            self.samplers[key] = sampler
+        return sampler()
+
+    def number(self, key, low, high, digits=2, integer=False):
+        spec = self.distributions.get(key)
+        if not spec or spec['kind'] not in NUMERIC_KINDS:
+            return random.randint(low, high) if integer else round(random.uniform(low, high), digits)
+        sampler = self.samplers.get(key)
+        if sampler is None:
+            sampler = NumericDistribution(spec, digits, integer)
+            self.samplers[key] = sampler
+        return sampler()
@@ -1,110 +1,537 @@
+import asyncio
 import multiprocessing
+import os
+from collections import deque
+from datetime import datetime
 from faker import Faker
+import numpy as np
 import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 
-from core.ai_agent import AIAgent
+from core.ai_agent import AIAgent, AsyncAIClient
+from core.ai_prefetch import AIPrefetcher
+from core.value_pools import get_pool
+from core.tuning import BatchTuner
+from core.key_index import KeyIndex
+from core.db_connector import ForeignKeyError
+from core.distributions import SKEW_KINDS, NUMERIC_KINDS, NumericDistribution, SkewedKey, skewed_options
 
 fake = Faker()
 
-def generate_row(columns_metadata, ai_config=None):
+_rng = None
+_rng_pid = None
+
+def get_rng():
+    """Per-process NumPy generator (re-seeded after a fork)."""
+    global _rng, _rng_pid
+    if _rng is None or _rng_pid != os.getpid():
+        _rng = np.random.default_rng()
+        _rng_pid = os.getpid()
+    return _rng
+
+DIAGNOSES = ["Hypertension", "Flu", "Migraine", "Fracture", "Diabetes", "Asthma", "Anxiety"]
+DEPARTMENTS = ["Cardiology", "ER", "Neurology", "Pediatrics", "Oncology", "Orthopedics"]
+MAJORS = ["Computer Science", "Mechanical Engineering", "Psychology", "Economics", "History"]
+COURSES = ["Big Data", "Algorithms", "Calculus", "Quantum Mechanics", "Genetics"]
+UNITS = ["°C", "Pa", "kW", "m/s", "Lux", "%RH"]
+TYPE_CHOICES = ["Standard", "Premium", "Legacy", "Experimental"]
+LOCATIONS = ["Zone A", "Zone B", "Warehouse", "Lab", "Global"]
+
+ID_COLUMNS = ['user_id', 'customer_id', 'patient_id', 'account_id', 'sensor_id', 'student_id']
+MONEY_COLUMNS = ['price', 'cost', 'amount', 'balance']
+DESCRIPTIVE_FIELDS = ['desc', 'bio', 'review', 'comment', 'diagnosis', 'major', 'course', 'content']
+
+# --- Value producers ---
+# Each producer is a small picklable object built once per table by
+# compile_column_plan(). Calling it returns one value for one cell;
+# batch(n, rng) returns a whole column of n values for columnar mode.
+
+class Choice:
+    def __init__(self, options):
+        self.options = options
+
+    def __call__(self):
+        return random.choice(self.options)
+
+    def batch(self, n, rng):
+        options = np.empty(len(self.options), dtype=object)
+        options[:] = self.options
+        return options[rng.integers(0, len(self.options), n)]
+
+class IntRange:
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def __call__(self):
+        return random.randint(self.low, self.high)
+
+    def batch(self, n, rng):
+        return rng.integers(self.low, self.high + 1, n)
+
+class FloatRange:
+    def __init__(self, low, high, digits=2):
+        self.low = low
+        self.high = high
+        self.digits = digits
+
+    def __call__(self):
+        return round(random.uniform(self.low, self.high), self.digits)
+
+    def batch(self, n, rng):
+        return np.round(rng.uniform(self.low, self.high, n), self.digits)
+
+class Flag:
+    """1 with the given probability, else 0 (e.g. is_fraud)."""
+    def __init__(self, probability):
+        self.probability = probability
+
+    def __call__(self):
+        return 1 if random.random() < self.probability else 0
+
+    def batch(self, n, rng):
+        return (rng.random(n) < self.probability).astype(np.int64)
+
+class FakerValue:
+    """Calls a Faker provider, or samples its value pool when pools are enabled."""
+    def __init__(self, provider, pool=None, **kwargs):
+        self.provider = provider
+        self.pool = pool # pool settings from settings.yaml, None = call Faker directly
+        self.kwargs = kwargs
+
+    def __call__(self):
+        if self.pool:
+            return get_pool(self.provider, self.kwargs, self.pool).sample()
+        return getattr(fake, self.provider)(**self.kwargs)
+
+    def batch(self, n, rng):
+        if self.pool:
+            return get_pool(self.provider, self.kwargs, self.pool).sample_many(n, rng)
+        return [self() for _ in range(n)]
+
+class DecadeTimestamp:
+    """Same range as fake.date_time_this_decade(): decade start up to now."""
+    def __call__(self):
+        return str(fake.date_time_this_decade())
+
+    def batch(self, n, rng):
+        now = datetime.now()
+        start = np.datetime64(datetime(now.year - now.year % 10, 1, 1), 'us')
+        span = int((np.datetime64(now, 'us') - start) / np.timedelta64(1, 'us'))
+        stamps = start + rng.integers(0, span + 1, n).astype('timedelta64[us]')
+        return np.char.replace(np.datetime_as_string(stamps, unit='us'), 'T', ' ')
+
+class ForeignKey:
+    """Samples existing keys of the parent table from its KeyIndex."""
+    def __init__(self, index):
+        self.index = index
+
+    def __call__(self):
+        return self.index.sample()
+
+    def batch(self, n, rng):
+        return self.index.sample_many(n, rng)
+
+class Constant:
+    def __init__(self, value):
+        self.value = value
+
+    def __call__(self):
+        return self.value
+
+    def batch(self, n, rng):
+        return [self.value] * n
+
+# One AIAgent (and HTTP connection pool) per worker process and endpoint
+_agents = {}
+
+def get_ai_agent(ai_config):
+    """Returns this process's agent for ai_config, creating it on first use."""
+    key = (os.getpid(), ai_config.get('api_url'), ai_config.get('model'))
+    agent = _agents.get(key)
+    if agent is None:
+        agent = AIAgent({'ai': ai_config, 'generation': {'use_ai_mode': True}})
+        _agents[key] = agent
+    return agent
+
+# With ai.async_requests, AI calls run on an event loop thread in each worker process
+_async_clients = {}
+_ai_loop = None
+_ai_loop_pid = None
+
+def get_ai_loop():
+    """This process's AI event loop, running in a daemon thread (restarted after a fork)."""
+    global _ai_loop, _ai_loop_pid
+    if _ai_loop is None or _ai_loop_pid != os.getpid():
+        _ai_loop = asyncio.new_event_loop()
+        _ai_loop_pid = os.getpid()
+        threading.Thread(target=_ai_loop.run_forever, name="ai-loop", daemon=True).start()
+    return _ai_loop
+
+def get_async_ai_client(ai_config):
+    """Returns this process's async client for ai_config, creating it on first use."""
+    key = (os.getpid(), ai_config.get('api_url'), ai_config.get('model'))
+    client = _async_clients.get(key)
+    if client is None:
+        client = AsyncAIClient(ai_config)
+        _async_clients[key] = client
+    return client
+
+# With ai.background_prefetch, one prefetch service per worker process and endpoint
+_prefetchers = {}
+
+def get_prefetcher(ai_config):
+    """Returns this process's prefetch service for ai_config, creating it on first use."""
+    key = (os.getpid(), ai_config.get('api_url'), ai_config.get('model'))
+    prefetcher = _prefetchers.get(key)
+    if prefetcher is None:
+        prefetcher = AIPrefetcher(ai_config)
+        _prefetchers[key] = prefetcher
+    return prefetcher
+
+# Cells filled by AIText per process: {pid: [from_ai, from_fallback]}
+_ai_cells = {}
+
+def count_ai_cells(from_ai, from_fallback):
+    cells = _ai_cells.setdefault(os.getpid(), [0, 0])
+    cells[0] += from_ai
+    cells[1] += from_fallback
+
+def ai_worker_stats():
+    """Combined call stats of this process's agents, or None if AI was never used."""
+    pid = os.getpid()
+    agents = [agent for key, agent in _agents.items() if key[0] == pid]
+    agents += [client for key, client in _async_clients.items() if key[0] == pid]
+    for key, prefetcher in _prefetchers.items():
+        if key[0] == pid:
+            agents += prefetcher.agents
+    if not agents and pid not in _ai_cells:
+        return None
+    stats = [agent.get_stats() for agent in agents]
+    calls = sum(st['calls'] for st in stats)
+    from_ai, from_fallback = _ai_cells.get(pid, (0, 0))
+    return {
+        'pid': pid,
+        'calls': calls,
+        'errors': sum(st['errors'] for st in stats),
+        'connections': sum(st['connections'] for st in stats),
+        'avg_latency': sum(st['avg_latency'] * st['calls'] for st in stats) / calls if calls else 0.0,
+        'cache_hits': sum(st['cache_hits'] for st in stats),
+        'ai_cells': from_ai,
+        'fallback_cells': from_fallback,
+    }
+
+def cancel_ai_requests():
+    """Cancels this process's in-flight async AI requests (their buffers fall back to Faker)."""
+    # list(): called from the UI thread while seeding threads add requests
+    for key, pending in list(_ai_pending.items()):
+        if key[0] == os.getpid():
+            for future, _ in list(pending):
+                future.cancel()
+
+# Values fetched ahead by batched prompts, per worker process and column,
+# as (value, from_ai) pairs
+_ai_buffers = {}
+# Async requests still in flight for a column: [(future, values_requested)]
+_ai_pending = {}
+
+class AIText:
+    """
+    Asks the AI agent first and falls back to another producer.
+    With ai.values_per_call > 1, one prompt fetches that many values into a
+    per-process column buffer; slots the reply could not fill (malformed or
+    short answers) are filled by the fallback instead.
+    With ai.async_requests, prefetch(n) starts the calls for n values on the
+    process's event loop and returns at once, so the worker can build the
+    other columns while the model answers.
+    With ai.background_prefetch, values come from the process's AIPrefetcher
+    and never wait longer than its latency budget.
+    """
+    def __init__(self, ai_config, col_name, fallback):
+        self.ai_config = ai_config
+        self.col_name = col_name
+        self.fallback = fallback
+        self.table_name = ai_config.get('table', 'table')
+        self.per_call = ai_config.get('values_per_call', 1)
+        self.use_async = ai_config.get('async_requests', False)
+        self.background = ai_config.get('background_prefetch', False)
+
+    def key(self):
+        return (os.getpid(), self.ai_config.get('api_url'), self.ai_config.get('model'), self.table_name, self.col_name)
+
+    def buffer(self):
+        buf = _ai_buffers.get(self.key())
+        if buf is None:
+            buf = deque()
+            _ai_buffers[self.key()] = buf
+        return buf
+
+    def fill(self, buf, values, count):
+        buf.extend((v, True) for v in values)
+        buf.extend((self.fallback(), False) for _ in range(count - len(values)))
+
+    def refill(self, buf):
+        ai_agent = get_ai_agent(self.ai_config)
+        values = ai_agent.generate_batch(self.table_name, self.col_name, self.per_call, context_hint=f"Values for {self.col_name}")
+        self.fill(buf, values, self.per_call)
+
+    def prefetch(self, n):
+        """Starts async requests for the values of n more cells not yet buffered or requested."""
+        if self.background:
+            get_prefetcher(self.ai_config).register(self.table_name, self.col_name, f"Values for {self.col_name}")
+            return
+        if not self.use_async:
+            return
+        pending = _ai_pending.setdefault(self.key(), deque())
+        missing = n - len(self.buffer()) - sum(count for _, count in pending)
+        if missing <= 0:
+            return
+        if self.per_call > 1:
+            missing = -(-missing // self.per_call) * self.per_call
+        client = get_async_ai_client(self.ai_config)
+        coro = client.generate_values(self.table_name, self.col_name, missing, self.per_call,
+                                      context_hint=f"Values for {self.col_name}")
+        pending.append((asyncio.run_coroutine_threadsafe(coro, get_ai_loop()), missing))
+
+    def collect(self, buf):
+        """Waits for the oldest async request; values it could not produce come from the fallback."""
+        future, count = _ai_pending[self.key()].popleft()
+        try:
+            values = future.result()
+        except Exception: # includes cancellation
+            values = []
+        self.fill(buf, values, count)
+
+    def __call__(self):
+        if self.background:
+            val = get_prefetcher(self.ai_config).take(self.table_name, self.col_name, f"Values for {self.col_name}")
+            from_ai = val is not None
+            if not from_ai:
+                val = self.fallback()
+        elif self.use_async or self.per_call > 1:
+            buf = self.buffer()
+            if not buf:
+                if not self.use_async:
+                    self.refill(buf)
+                else:
+                    if not _ai_pending.get(self.key()):
+                        self.prefetch(1)
+                    self.collect(buf)
+            val, from_ai = buf.popleft()
+        else:
+            ai_agent = get_ai_agent(self.ai_config)
+            val = ai_agent.generate_text(self.table_name, self.col_name, context_hint=f"Value for {self.col_name}")
+            from_ai = val is not None
+            if not from_ai:
+                val = self.fallback()
+        count_ai_cells(int(from_ai), int(not from_ai))
+        return val
+
+    def batch(self, n, rng):
+        self.prefetch(n)
+        return [self() for _ in range(n)]
+
+def apply_distribution(producer, spec):
+    """Swaps a uniform producer for one following the column's distribution spec."""
+    kind = spec.get('kind')
+    if isinstance(producer, AIText):
+        producer.fallback = apply_distribution(producer.fallback, spec)
+    elif isinstance(producer, ForeignKey) and kind in ('zipf', 'pareto'):
+        return SkewedKey(producer.index, spec)
+    elif isinstance(producer, Choice) and kind in SKEW_KINDS:
+        return skewed_options(spec, producer.options)
+    elif isinstance(producer, IntRange) and kind in ('zipf', 'pareto'):
+        # Skew over the id range itself (e.g. *_id columns without a declared FK)
+        return SkewedKey(KeyIndex([producer.low], [producer.high]), spec)
+    elif isinstance(producer, IntRange) and kind in NUMERIC_KINDS:
+        return NumericDistribution(spec, integer=True)
+    elif isinstance(producer, FloatRange) and kind in NUMERIC_KINDS:
+        return NumericDistribution(spec, digits=producer.digits)
+    return producer
+
+def compile_column(col_name, col_type, ai_config=None, pool_config=None, key_index=None, distribution=None):
+    """Turns one column's metadata into a value producer, with its distribution applied."""
+    producer = classify_column(col_name, col_type, ai_config, pool_config, key_index)
+    if distribution:
+        producer = apply_distribution(producer, distribution)
+    return producer
+
+def classify_column(col_name, col_type, ai_config=None, pool_config=None, key_index=None):
+    """Picks the uniform producer for a column from its name and type."""
+    # Declared foreign keys point at rows that actually exist in the parent
+    if key_index is not None and len(key_index) > 0:
+        return ForeignKey(key_index)
+
+    pool = pool_config if pool_config and pool_config.get('enabled') else None
+    col_lower = col_name.lower()
+    type_lower = col_type.lower() if col_type else 'text'
+
+    # Domain-Specific Logic
+    if 'diagnosis' in col_lower:
+        producer = Choice(DIAGNOSES)
+    elif 'department' in col_lower:
+        producer = Choice(DEPARTMENTS)
+    elif 'major' in col_lower:
+        producer = Choice(MAJORS)
+    elif 'course' in col_lower:
+        producer = Choice(COURSES)
+    elif 'unit' in col_lower:
+        producer = Choice(UNITS)
+
+    # Numeric Rules
+    elif 'int' in type_lower or 'integer' in type_lower:
+        if 'age' in col_lower:
+            producer = IntRange(1, 95)
+        elif 'score' in col_lower:
+            producer = IntRange(0, 100)
+        elif 'is_fraud' in col_lower:
+            producer = Flag(0.05)
+        elif any(x in col_lower for x in ID_COLUMNS):
+            producer = IntRange(1, 100)
+        elif 'quantity' in col_lower:
+            producer = IntRange(1, 10)
+        elif 'rating' in col_lower:
+            producer = IntRange(1, 5)
+        else:
+            producer = IntRange(1, 1000)
+
+    # Currency / Float Rules
+    elif any(x in type_lower for x in ['real', 'float', 'double', 'decimal']):
+        if any(x in col_lower for x in MONEY_COLUMNS):
+            producer = FloatRange(10.0, 5000.0)
+        elif 'value' in col_lower:
+            producer = FloatRange(-20.0, 150.0)
+        else:
+            producer = FloatRange(0, 100)
+
+    # String Rules
+    elif any(x in type_lower for x in ['char', 'text']):
+        if 'email' in col_lower:
+            producer = FakerValue('email', pool)
+        elif 'name' in col_lower or 'owner' in col_lower:
+            producer = FakerValue('name', pool)
+        elif 'city' in col_lower:
+            producer = FakerValue('city', pool)
+        elif 'type' in col_lower:
+            producer = Choice(TYPE_CHOICES)
+        elif 'location' in col_lower:
+            producer = Choice(LOCATIONS)
+        else:
+            producer = FakerValue('sentence', pool, nb_words=6)
+
+    # Temporal Rules
+    elif 'date' in type_lower or 'time' in type_lower:
+        producer = DecadeTimestamp()
+
+    # Boolean
+    elif 'bool' in type_lower:
+        producer = Choice([True, False])
+
+    else:
+        producer = Constant("DataForge_Gen")
+
+    # AI Attempt for specific fields or any descriptive text
+    if ai_config and ai_config.get('enabled') and ('text' in type_lower or 'varchar' in type_lower or 'char' in type_lower):
+        if any(x in col_lower for x in DESCRIPTIVE_FIELDS):
+            producer = AIText(ai_config, col_name, producer)
+
+    return producer
+
+def compile_column_plan(columns_metadata, ai_config=None, pool_config=None, foreign_keys=None, distributions=None):
+    """
+    Compiles column metadata into a list of value producers, one per column.
+    Run once per table so workers don't re-classify columns for every row.
+    columns_metadata: List of (name, type, is_nullable)
+    pool_config: The 'pools' section of settings.yaml (optional)
+    foreign_keys: Dict {column_name: KeyIndex} of the parent keys (optional)
+    distributions: Dict {column_name: spec} of skewed distributions (optional)
+    """
+    foreign_keys = foreign_keys or {}
+    distributions = distributions or {}
+    return [compile_column(col_name, col_type, ai_config, pool_config,
+                           foreign_keys.get(col_name), distributions.get(col_name))
+            for col_name, col_type, _ in columns_metadata]
+
+def generate_row(columns_metadata, ai_config=None, plan=None):
     """
     Generates a single row of data based on column types.
     columns_metadata: List of (name, type, is_nullable)
     ai_config: Dictionary containing AI settings if enabled
+    plan: Precompiled producers from compile_column_plan (optional)
     """
-    ai_agent = None
-    if ai_config and ai_config.get('enabled'):
-         ai_agent = AIAgent({'ai': ai_config, 'generation': {'use_ai_mode': True}})
-
-    row = []
-    for col_name, col_type, is_nullable in columns_metadata:
-        val = None
-        col_lower = col_name.lower()
-        type_lower = col_type.lower() if col_type else 'text'
-        
-        # AI Attempt for specific fields or any descriptive text
-        if ai_agent and ('text' in type_lower or 'varchar' in type_lower or 'char' in type_lower):
-            descriptive_fields = ['desc', 'bio', 'review', 'comment', 'diagnosis', 'major', 'course', 'content']
-            if any(x in col_lower for x in descriptive_fields):
-                val = ai_agent.generate_text("table", col_name, context_hint=f"Value for {col_name}")
-
-        if val is None:
-            # Domain-Specific Logic
-            if 'diagnosis' in col_lower:
-                val = random.choice(["Hypertension", "Flu", "Migraine", "Fracture", "Diabetes", "Asthma", "Anxiety"])
-            elif 'department' in col_lower:
-                val = random.choice(["Cardiology", "ER", "Neurology", "Pediatrics", "Oncology", "Orthopedics"])
-            elif 'major' in col_lower:
-                val = random.choice(["Computer Science", "Mechanical Engineering", "Psychology", "Economics", "History"])
-            elif 'course' in col_lower:
-                val = random.choice(["Big Data", "Algorithms", "Calculus", "Quantum Mechanics", "Genetics"])
-            elif 'unit' in col_lower:
-                val = random.choice(["°C", "Pa", "kW", "m/s", "Lux", "%RH"])
-            
-            # Numeric Rules
-            elif 'int' in type_lower or 'integer' in type_lower:
-                if 'age' in col_lower:
-                    val = random.randint(1, 95)
-                elif 'score' in col_lower:
-                    val = random.randint(0, 100)
-                elif 'is_fraud' in col_lower:
-                    val = 1 if random.random() < 0.05 else 0
-                elif any(x in col_lower for x in ['user_id', 'customer_id', 'patient_id', 'account_id', 'sensor_id', 'student_id']):
-                    val = random.randint(1, 100)
-                elif 'quantity' in col_lower:
-                    val = random.randint(1, 10)
-                elif 'rating' in col_lower:
-                    val = random.randint(1, 5)
-                else:
-                    val = random.randint(1, 1000)
-            
-            # Currency / Float Rules
-            elif any(x in type_lower for x in ['real', 'float', 'double', 'decimal']):
-                if any(x in col_lower for x in ['price', 'cost', 'amount', 'balance']):
-                    val = round(random.uniform(10.0, 5000.0), 2)
-                elif 'value' in col_lower:
-                    val = round(random.uniform(-20.0, 150.0), 2)
-                else:
-                    val = round(random.uniform(0, 100), 2)
-            
-            # String Rules
-            elif any(x in type_lower for x in ['char', 'text']):
-                if 'email' in col_lower:
-                    val = fake.email()
-                elif 'name' in col_lower or 'owner' in col_lower:
-                    val = fake.name()
-                elif 'city' in col_lower:
-                    val = fake.city()
-                elif 'type' in col_lower:
-                    val = random.choice(["Standard", "Premium", "Legacy", "Experimental"])
-                elif 'location' in col_lower:
-                    val = random.choice(["Zone A", "Zone B", "Warehouse", "Lab", "Global"])
-                else:
-                    val = fake.sentence(nb_words=6)
-            
-            # Temporal Rules
-            elif 'date' in type_lower or 'time' in type_lower:
-                val = str(fake.date_time_this_decade())
-            
-            # Boolean
-            elif 'bool' in type_lower:
-                val = random.choice([True, False])
-            
-            else:
-                val = "DataForge_Gen"
-        
-        row.append(val)
-    return tuple(row)
+    if plan is None:
+        plan = compile_column_plan(columns_metadata, ai_config)
+    return tuple(producer() for producer in plan)
+
+def generate_columns(plan, n, rng=None):
+    """
+    Columnar mode: generates n values for every column at once.
+    Returns one list per column, with NumPy scalars converted to Python types.
+    """
+    rng = rng or get_rng()
+    # Start the AI requests first and build the AI columns last, so the
+    # model answers while the other columns are generated
+    for producer in plan:
+        if isinstance(producer, AIText):
+            producer.prefetch(n)
+    columns = [None] * len(plan)
+    order = sorted(range(len(plan)), key=lambda i: isinstance(plan[i], AIText))
+    for i in order:
+        values = plan[i].batch(n, rng)
+        columns[i] = values.tolist() if isinstance(values, np.ndarray) else list(values)
+    return columns
 
-def worker_generate_chunk(chunk_size, columns_metadata, queue, ai_config=None):
+def generate_chunk(chunk_size, plan, columnar=False):
+    """Builds chunk_size rows, either row by row or column by column."""
+    if columnar:
+        # Zip columns into rows only at the very end, for bulk_insert
+        return list(zip(*generate_columns(plan, chunk_size)))
+    for producer in plan:
+        if isinstance(producer, AIText):
+            producer.prefetch(chunk_size)
+    return [tuple(producer() for producer in plan) for _ in range(chunk_size)]
+
+def init_worker():
+    """
+    Pool initializer: runs once per worker process. Forked workers start with
+    copies of the parent's random state, so give each one its own seed.
+    """
+    random.seed()
+    fake.seed_instance(random.getrandbits(64))
+    get_rng()
+
+def worker_generate_chunk(chunk_size, plan, columnar=False):
     """
     Worker function to generate a batch of data.
+    The chunk is returned straight to the parent through the pool's result pipe,
+    together with the seconds it took to build and this worker's AI call stats.
+    """
+    start = time.perf_counter()
+    chunk = generate_chunk(chunk_size, plan, columnar)
+    return chunk, time.perf_counter() - start, ai_worker_stats()
+
+def worker_write_shard(chunk_size, plan, columnar, shards, table_name, columns, first_id=None):
     """
-    chunk = []
-    for _ in range(chunk_size):
-        chunk.append(generate_row(columns_metadata, ai_config))
-    queue.put(chunk)
+    Sharded write mode: builds a batch and writes it to this worker's shard
+    instead of returning it. first_id numbers the rows' primary keys from
+    the range the parent gave the batch. Returns the row count, the seconds
+    it took and this worker's AI call stats.
+    """
+    start = time.perf_counter()
+    chunk = generate_chunk(chunk_size, plan, columnar)
+    if first_id is not None:
+        chunk = [(first_id + i,) + row for i, row in enumerate(chunk)]
+    shards.insert(table_name, columns, chunk)
+    return len(chunk), time.perf_counter() - start, ai_worker_stats()
+
+class SeedingCancelled(Exception):
+    """Raised by seed_table when DataGenerator.cancel() was called."""
+
+class TableSkipped(Exception):
+    """Reported by seed_tables for a table left empty because a parent table failed."""
 
 class DataGenerator:
     def __init__(self, db_connector, config):
@@ -112,13 +539,118 @@ class DataGenerator:
         self.config = config # Store full config
         self.batch_size = config['generation']['batch_size']
         self.num_workers = config['generation']['workers']
+        self.columnar = config['generation'].get('columnar', False)
+        # Batches generated ahead of the writer; bounds memory held in the pipeline
+        self.max_in_flight = config['generation'].get('max_in_flight', self.num_workers * 2)
+        # Seconds a single batch may take before its worker is considered hung (0 = no limit)
+        self.batch_timeout = config['generation'].get('batch_timeout', 0)
+        self.cancelled = threading.Event()
+        # Adjust batch_size / max_in_flight per table from measured throughput
+        self.autotune = config['generation'].get('autotune', False)
+        self.max_batch_mb = config['generation'].get('max_batch_mb', 64)
+        # Long-lived worker pool, shared by every table of a seeding run
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        # SQLite takes one writer at a time; tables seeded in parallel queue here
+        self.writer = None # writer thread shared by the tables of a seed_tables run
+        # Drop indexes/triggers and skip FK checks while loading, rebuild and validate after
+        self.defer_constraints = (config.get('load') or {}).get('defer_constraints', False)
+        # Workers write to their own shard files, merged into the database per table
+        self.sharded = (config.get('load') or {}).get('shards', False)
+        self.shards = None # shards shared by the tables of a seed_tables run
+        # Foreign keys read before a load suspended them (Postgres drops the constraints)
+        self.declared_fks = {}
+        # Parent keys for FK columns: {(table, column): KeyIndex}
+        self.key_indexes = {}
+        self.key_lock = threading.Lock()
+        # Latest AI call stats reported by each worker: {pid: stats}
+        self.ai_stats = {}
+
+    def __enter__(self):
+        return self
 
-    def seed_table(self, table_name, total_rows):
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        """Starts the worker pool (once per run) and returns it."""
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = multiprocessing.Pool(processes=self.num_workers, initializer=init_worker)
+            return self.pool
+
+    def close(self):
+        """Shuts down the worker pool."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def terminate(self):
+        """Kills the worker pool without waiting for running batches."""
+        cancel_ai_requests() # The workers' own requests die with them
+        with self.pool_lock:
+            if self.pool is not None:
+                self.pool.terminate()
+                self.pool.join()
+                self.pool = None
+
+    def cancel(self):
+        """Asks a running seed_table to stop; safe to call from another thread."""
+        self.cancelled.set()
+        cancel_ai_requests()
+
+    def wait_for_batch(self, result, pool=None):
+        """
+        Waits for one batch, checking for cancellation while it runs.
+        Worker exceptions are re-raised here; a batch over batch_timeout raises TimeoutError.
+        """
+        deadline = time.time() + self.batch_timeout if self.batch_timeout else None
+        while not result.ready():
+            if self.cancelled.is_set():
+                raise SeedingCancelled()
+            if deadline and time.time() > deadline:
+                raise TimeoutError(f"Batch did not finish within {self.batch_timeout}s")
+            if pool is not None and self.pool is not pool:
+                # Another table terminated the shared pool; this batch is lost
+                raise RuntimeError("Worker pool was restarted while the batch was running")
+            result.wait(0.1)
+        return result.get()
+
+    def get_key_index(self, table_name, column=None):
+        """Returns the KeyIndex of a parent table, loading it on first use."""
+        with self.key_lock:
+            key = (table_name, column)
+            if key not in self.key_indexes:
+                self.key_indexes[key] = KeyIndex.from_table(self.db, table_name, column)
+            return self.key_indexes[key]
+
+    def declared_foreign_keys(self, table_name):
+        """(column, parent_table, parent_column) per foreign key, including ones suspended for the load."""
+        declared = self.declared_fks.get(table_name)
+        if declared is None:
+            declared = self.db.foreign_keys(table_name)
+        return declared
+
+    def get_foreign_keys(self, table_name):
+        """Returns {column: KeyIndex} for the table's declared foreign keys."""
+        foreign_keys = {}
+        for column, parent, parent_column in self.declared_foreign_keys(table_name):
+            if parent != table_name:
+                foreign_keys[column] = self.get_key_index(parent, parent_column)
+        return foreign_keys
+
+    def seed_table(self, table_name, total_rows, shared_by=1):
         """
         Orchestrates the seeding process.
+        Writes exactly total_rows rows and returns that count. Raises the
+        worker's exception if a batch fails, TimeoutError if a batch hangs
+        and SeedingCancelled after cancel().
+        shared_by: number of tables seeded at the same time; they split the
+        in-flight budget and the workers between them.
         """
-        # Get schema using SQLite PRAGMA
-        raw_columns = self.db.execute_query(f"PRAGMA table_info({table_name})")
+        # Get schema from the backend (PRAGMA table_info on SQLite)
+        raw_columns = self.db.table_columns(table_name)
         if not raw_columns:
             print(f"Table {table_name} not found.")
             return
@@ -127,6 +659,7 @@ class DataGenerator:
         # PRAGMA returns: (cid, name, type, notnull, dflt_value, pk)
         columns_meta = []
         column_names = []
+        key_column = None
         for row in raw_columns:
             col_name = row[1]
             col_type = (row[2] or 'text').lower()
@@ -134,48 +667,246 @@ class DataGenerator:
             is_pk = row[5] == 1
             # Skip auto-increment primary keys
             if is_pk and 'int' in col_type:
+                key_column = col_name
                 continue
             columns_meta.append((col_name, col_type, is_nullable))
             column_names.append(col_name)
         
-        # Setup Multiprocessing
-        manager = multiprocessing.Manager()
-        queue = manager.Queue(maxsize=self.num_workers * 2)
-        
-        pool = multiprocessing.Pool(processes=self.num_workers)
-        
-        rows_generated = 0
-        active_workers = 0
-        
         # Prepare AI config for workers
         ai_config = None
         if self.config['generation']['use_ai_mode']:
-            ai_config = self.config['ai']
-            ai_config['enabled'] = True
+            ai_config = dict(self.config['ai'], enabled=True, table=table_name)
+
+        # Distribution specs are keyed "table.column" in settings.yaml
+        prefix = f"{table_name}."
+        distributions = {key[len(prefix):]: spec for key, spec in (self.config.get('distributions') or {}).items()
+                         if key.startswith(prefix)}
 
-        # Start initial workers
-        for _ in range(self.num_workers):
-            pool.apply_async(worker_generate_chunk, args=(self.batch_size, columns_meta, queue, ai_config))
-            active_workers += 1
+        plan = compile_column_plan(columns_meta, ai_config, self.config.get('pools'),
+                                   self.get_foreign_keys(table_name), distributions)
+
+        # Producer/consumer pipeline: workers return chunks through the pool's
+        # result pipe, the parent writes them in order. At most max_in_flight
+        # batches are generated ahead of the writer.
+        pool = self.start()
+        in_flight = deque()
+        rows_scheduled = 0
+        rows_generated = 0
+        table_in_flight = max(1, self.max_in_flight // shared_by)
+        tuner = None
+        if self.autotune:
+            tuner = BatchTuner(self.batch_size, table_in_flight, max(1, self.num_workers // shared_by),
+                               self.max_batch_mb // shared_by)
 
         start_time = time.time()
-        
-        while rows_generated < total_rows:
-            # Consume from queue
-            chunk = queue.get()
-            
-            # Write to DB
-            self.db.bulk_insert(table_name, column_names, chunk)
-            rows_generated += len(chunk)
-            
-            # Schedule next task
-            if rows_generated + (active_workers * self.batch_size) < total_rows:
-                 pool.apply_async(worker_generate_chunk, args=(self.batch_size, columns_meta, queue, ai_config))
-            else:
-                active_workers -= 1
-                
-        pool.close()
-        pool.join()
-        
+
+        # Start the table's row counter before writing, so the commits below are added to it
+        self.db.row_counts.get(table_name)
+
+        # Batches are handed to a writer thread with one connection, unless
+        # seed_tables holds a session and writer for the whole run
+        own_writer = self.writer is None
+        if own_writer:
+            session = self.db.bulk_load()
+            if self.defer_constraints:
+                session.suspend_constraints([table_name])
+            writer = self.db.writer(session)
+            shards = self.db.shards() if self.sharded else None
+        else:
+            writer = self.writer
+            shards = self.shards
+        if shards is not None:
+            # Batches get consecutive id ranges after the table's current keys
+            write_columns = ([key_column] if key_column else []) + column_names
+            first_id = None
+            if key_column:
+                first_id = self.db.execute_query(f"SELECT COALESCE(MAX({key_column}), 0) + 1 FROM {table_name}")[0][0]
+        try:
+            while rows_generated < total_rows:
+                if self.cancelled.is_set():
+                    raise SeedingCancelled()
+
+                batch_size = tuner.batch_size if tuner else self.batch_size
+                max_in_flight = tuner.max_in_flight if tuner else table_in_flight
+                while rows_scheduled < total_rows and len(in_flight) < max_in_flight:
+                    # The last batch is cut to size so the table gets exactly total_rows
+                    size = min(batch_size, total_rows - rows_scheduled)
+                    if shards is None:
+                        task = pool.apply_async(worker_generate_chunk, args=(size, plan, self.columnar))
+                    else:
+                        ids = first_id + rows_scheduled if first_id is not None else None
+                        task = pool.apply_async(worker_write_shard, args=(size, plan, self.columnar, shards,
+                                                                          table_name, write_columns, ids))
+                    in_flight.append(task)
+                    rows_scheduled += size
+
+                waited = time.perf_counter()
+                chunk, gen_seconds, ai_stats = self.wait_for_batch(in_flight.popleft(), pool)
+                if ai_stats:
+                    self.ai_stats[ai_stats['pid']] = ai_stats
+                waited = time.perf_counter() - waited
+
+                if shards is not None:
+                    # Already in the worker's shard (written within gen_seconds); chunk is its row count
+                    inserted = 0.0
+                    rows_generated += chunk
+                else:
+                    # Hand off to the writer; only blocks while its buffer is full
+                    inserted = writer.put(table_name, column_names, chunk)
+                    rows_generated += len(chunk)
+
+                if tuner:
+                    tuner.record(chunk, gen_seconds, waited, inserted)
+
+            if shards is not None:
+                writer.merge(shards, table_name, write_columns)
+            writer.end_table(table_name)
+        except SeedingCancelled:
+            # Workers may be stuck mid-batch; start a fresh pool for the next table
+            self.terminate()
+            raise
+        except Exception as e:
+            if isinstance(e, TimeoutError):
+                self.terminate()
+            # A failed table writes nothing: take out the rows it already wrote
+            writer.abort_table(table_name)
+            raise
+        finally:
+            if own_writer:
+                try:
+                    writer.close()
+                finally:
+                    if shards is not None:
+                        shards.close()
+                    self.close_session(session)
+
+        # The table has new keys now; children reload its index on next use
+        with self.key_lock:
+            for key in [k for k in self.key_indexes if k[0] == table_name]:
+                del self.key_indexes[key]
+
         duration = time.time() - start_time
         print(f"Seeded {total_rows} rows in {duration:.2f}s ({total_rows/duration:.0f} rows/s)")
+        if tuner:
+            # Report the settled values so they can be pinned in settings.yaml
+            print(f"Auto-tuned {table_name}: {tuner.summary()}")
+        self.print_ai_stats()
+        return rows_generated
+
+    def close_session(self, session):
+        """
+        Closes a load session, first rebuilding the indexes and triggers it
+        suspended. Raises ForeignKeyError if the final check finds violations,
+        or RestoreError if some of them could not be rebuilt.
+        """
+        try:
+            violations = session.restore_constraints() if self.defer_constraints else []
+        finally:
+            session.close()
+        if violations:
+            raise ForeignKeyError(violations)
+
+    def print_ai_stats(self):
+        """Per-worker AI connection counts and latency (cumulative for the run)."""
+        for pid, st in sorted(self.ai_stats.items()):
+            print(f"  AI worker {pid}: {st['calls']} calls, {st['errors']} errors, "
+                  f"{st['connections']} connections, {st['avg_latency'] * 1000:.0f} ms avg, "
+                  f"{st['cache_hits']} cache hits")
+        from_ai = sum(st['ai_cells'] for st in self.ai_stats.values())
+        total = from_ai + sum(st['fallback_cells'] for st in self.ai_stats.values())
+        if total:
+            print(f"  AI-sourced cells: {from_ai} of {total} ({100 * from_ai / total:.0f}%), the rest from Faker")
+
+    def seed_tables(self, generations, rows_per_table, on_table_start=None, on_table_done=None):
+        """
+        Seeds tables along the foreign-key DAG. Every table of a generation
+        (see SchemaParser.get_generations) has all its parents done, so the
+        whole generation is seeded at once, sharing the worker pool.
+        rows_per_table: an int, or a dict {table_name: rows}
+        on_table_start(table): called when a table starts
+        on_table_done(table, rows, error): called when a table finishes; error is None on success
+        Returns {table_name: rows_written}. A failed table counts 0 rows, and
+        so do the tables below it in the DAG, which are not seeded (they are
+        reported with a TableSkipped error). In a staged build the first
+        error is re-raised once the run is over instead, so the partial copy
+        is not swapped in.
+        """
+        results = {}
+        errors = {} # failed table -> its error
+        skipped = set()
+        generations = list(generations)
+        # Fork the workers before the writer and table threads exist: a child forked
+        # while another thread is inside SQLite inherits its locks and hangs on its shard
+        self.start()
+        # With load.build set, the run writes to a staging copy (in memory or on
+        # tmpfs) that replaces the database file only once it is complete
+        build = self.db.staged_build()
+        with build or nullcontext():
+            # One connection with load PRAGMAs and one writer thread for the whole run
+            session = self.db.bulk_load()
+            if self.defer_constraints:
+                tables = [table for generation in generations for table in generation]
+                catalog = self.db.catalog()
+                self.declared_fks = {table: catalog.foreign_keys.get(table, []) for table in tables}
+                session.suspend_constraints(tables)
+            self.writer = self.db.writer(session)
+            self.shards = self.db.shards() if self.sharded else None
+            try:
+                for generation in generations:
+                    if self.cancelled.is_set():
+                        raise SeedingCancelled()
+
+                    # Children of a failed table would only get orphan keys
+                    runnable = []
+                    for table in generation:
+                        lost = sorted({parent for _, parent, _ in self.declared_foreign_keys(table)}
+                                      & (errors.keys() | skipped))
+                        if not lost:
+                            runnable.append(table)
+                            continue
+                        skipped.add(table)
+                        results[table] = 0
+                        if on_table_done:
+                            on_table_done(table, 0, TableSkipped(f"parent table {', '.join(lost)} failed"))
+                    if not runnable:
+                        continue
+
+                    def run(table):
+                        if on_table_start:
+                            on_table_start(table)
+                        rows = rows_per_table.get(table, 0) if isinstance(rows_per_table, dict) else rows_per_table
+                        return self.seed_table(table, rows, shared_by=len(runnable))
+
+                    cancelled = False
+                    with ThreadPoolExecutor(max_workers=len(runnable)) as executor:
+                        futures = {executor.submit(run, table): table for table in runnable}
+                        for future in as_completed(futures):
+                            table = futures[future]
+                            error = None
+                            try:
+                                results[table] = future.result()
+                            except SeedingCancelled:
+                                cancelled = True
+                                continue
+                            except Exception as e:
+                                error = e
+                                errors[table] = e
+                                results[table] = 0
+                            if on_table_done:
+                                on_table_done(table, results[table], error)
+                    if cancelled:
+                        raise SeedingCancelled()
+                if build is not None and errors:
+                    raise next(iter(errors.values()))
+            finally:
+                writer, self.writer = self.writer, None
+                shards, self.shards = self.shards, None
+                self.declared_fks = {}
+                try:
+                    writer.close()
+                    print(f"Writer: {writer.summary()}")
+                finally:
+                    if shards is not None:
+                        shards.close()
+                    self.close_session(session)
+        return results
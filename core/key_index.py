@@ -0,0 +1,80 @@
+import bisect
+import random
+
+import numpy as np
+
+class KeyIndex:
+    """
+    Compact in-memory index of a parent table's keys, used to sample valid
+    foreign keys without per-row SELECTs.
+
+    Integer keys are kept as runs of consecutive values (starts/ends arrays):
+    an AUTOINCREMENT table is a single run, and deleted rows only add a few
+    more. Other key types fall back to a plain array of values.
+    """
+    def __init__(self, starts=None, ends=None, values=None):
+        self.values = values
+        if values is None:
+            self.starts = np.asarray(starts if starts is not None else [], dtype=np.int64)
+            self.ends = np.asarray(ends if ends is not None else [], dtype=np.int64)
+            # cum[i] = number of keys in runs before run i
+            lengths = self.ends - self.starts + 1
+            self.cum = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+    @classmethod
+    def from_table(cls, db, table, column=None):
+        """
+        Loads the keys of table.column (rowid when column is None or the
+        INTEGER PRIMARY KEY) with one aggregate query.
+        """
+        key = column or 'rowid'
+        if db.dialect == 'postgres':
+            # Typed columns: only integer keys can be kept as runs
+            types = {row[1]: row[2] for row in db.table_columns(table)}
+            integer_key = types.get(key) in ('smallint', 'integer', 'bigint')
+            where = ""
+        else:
+            # SQLite: any column may hold integers, checked value by value
+            integer_key = True
+            where = f"WHERE typeof({key}) = 'integer'"
+        runs = []
+        if integer_key:
+            # Gaps-and-islands: consecutive keys share the same key - row_number()
+            runs = db.execute_query(
+                f"SELECT MIN({key}), MAX({key}) FROM "
+                f"(SELECT {key}, {key} - ROW_NUMBER() OVER (ORDER BY {key}) AS grp FROM {table} "
+                f"{where}) AS numbered GROUP BY grp ORDER BY 1"
+            ) or []
+        count = db.execute_query(f"SELECT COUNT({key}) FROM {table}")
+        count = count[0][0] if count else 0
+        if count != sum(high - low + 1 for low, high in runs):
+            # Not an integer key: keep the distinct values themselves
+            rows = db.execute_query(f"SELECT DISTINCT {key} FROM {table} WHERE {key} IS NOT NULL") or []
+            values = np.empty(len(rows), dtype=object)
+            values[:] = [r[0] for r in rows]
+            return cls(values=values)
+        return cls([low for low, _ in runs], [high for _, high in runs])
+
+    def __len__(self):
+        if self.values is not None:
+            return len(self.values)
+        return int(self.cum[-1])
+
+    def sample(self):
+        if self.values is not None:
+            return self.values[random.randrange(len(self.values))]
+        k = random.randrange(int(self.cum[-1]))
+        run = bisect.bisect_right(self.cum, k) - 1
+        return int(self.starts[run] + (k - self.cum[run]))
+
+    def key_at(self, positions):
+        """Maps positions 0..len-1 (in key order) to the keys themselves."""
+        if self.values is not None:
+            return self.values[positions]
+        if len(self.starts) == 1:
+            return self.starts[0] + positions
+        run = np.searchsorted(self.cum, positions, side='right') - 1
+        return self.starts[run] + (positions - self.cum[run])
+
+    def sample_many(self, n, rng):
+        return self.key_at(rng.integers(0, len(self), n))
@@ -0,0 +1,193 @@
+"""
+Local stand-in for Ollama's /api/generate, for tests and benchmarks of the AI path.
+
+    python -m core.mock_ollama --port 11434 --latency lognormal --median 0.3 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSES = {
+    "diagnosis": ["Hypertension", "Influenza", "Migraine", "Fractured wrist", "Type 2 diabetes", "Asthma", "Bronchitis"],
+    "product": ["Wireless Mouse", "4K Monitor", "Mechanical Keyboard", "Noise-Cancelling Headphones", "USB-C Hub"],
+    "course": ["Linear Algebra", "Distributed Systems", "Organic Chemistry", "Quantum Mechanics", "Databases"],
+    "location": ["Assembly Line 3", "Boiler Room", "Loading Dock B", "Paint Shop", "Cold Storage"],
+}
+GENERIC_RESPONSES = ["Lorem ipsum", "Sample value", "Generated text", "Placeholder entry"]
+
+BATCH_PROMPT = re.compile(r"Generate (\d+) distinct")
+
+class Latency:
+    """
+    Per-call delay in seconds.
+    kind: constant (median), uniform (low..high), normal (median, sigma), lognormal (median, sigma)
+    """
+    def __init__(self, kind='constant', median=0.0, sigma=0.5, low=0.0, high=0.0):
+        self.kind = kind
+        self.median = median
+        self.sigma = sigma
+        self.low = low
+        self.high = high
+
+    def sample(self):
+        if self.kind == 'uniform':
+            return random.uniform(self.low, self.high)
+        if self.kind == 'normal':
+            return max(0.0, random.gauss(self.median, self.sigma))
+        if self.kind == 'lognormal':
+            return self.median * random.lognormvariate(0.0, self.sigma) if self.median > 0 else 0.0
+        return self.median
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        mock = self.server.mock
+        start = time.perf_counter()
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+        prompt = payload.get("prompt", "")
+
+        roll = random.random()
+        if roll < mock.hang_rate:
+            time.sleep(mock.hang_seconds) # Long enough for the client to time out
+        else:
+            time.sleep(mock.latency.sample())
+
+        if roll >= mock.hang_rate and roll < mock.hang_rate + mock.error_rate:
+            status, body = 500, json.dumps({"error": "model overloaded"}).encode()
+        else:
+            status, body = 200, json.dumps({"model": payload.get("model"), "response": mock.reply(prompt, roll), "done": True}).encode()
+
+        # Recorded before replying, so stats() already counts a call its client has seen
+        mock.record(time.perf_counter() - start, status != 200)
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass # The client gave up (timeout or cancellation)
+
+    def log_message(self, *args):
+        pass
+
+class MockOllama:
+    """
+    Serves /api/generate on a background thread:
+
+        with MockOllama(latency=Latency('lognormal', median=0.2), error_rate=0.05) as mock:
+            ai_config['api_url'] = mock.url
+            ...
+            print(mock.stats())
+
+    error_rate: share of calls answered with HTTP 500
+    hang_rate: share of calls held for hang_seconds before answering
+    malformed_rate: share of batch prompts answered with prose instead of a list
+    responses: {keyword: [values]}; the first keyword found in the prompt picks the values
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency=None, error_rate=0.0, hang_rate=0.0,
+                 hang_seconds=30.0, malformed_rate=0.0, responses=None):
+        self.latency = latency or Latency()
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.malformed_rate = malformed_rate
+        self.responses = responses or DEFAULT_RESPONSES
+        self.lock = threading.Lock()
+        self.reset()
+
+        self.server = ThreadingHTTPServer((host, port), MockOllamaHandler)
+        self.server.daemon_threads = True
+        self.server.mock = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/generate"
+
+    def values_for(self, prompt):
+        lowered = prompt.lower()
+        for keyword, values in self.responses.items():
+            if keyword in lowered:
+                return values
+        return GENERIC_RESPONSES
+
+    def reply(self, prompt, roll):
+        values = self.values_for(prompt)
+        match = BATCH_PROMPT.search(prompt)
+        if not match:
+            return random.choice(values)
+        if roll > 1.0 - self.malformed_rate:
+            return "I'm sorry, here are some ideas: " + ", ".join(values[:2])
+        n = int(match.group(1))
+        # Distinct values, numbered past the list's length like a model padding its answer
+        picks = [values[i % len(values)] + (f" {i // len(values) + 1}" if i >= len(values) else "") for i in range(n)]
+        random.shuffle(picks)
+        return json.dumps(picks)
+
+    def record(self, seconds, failed):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.errors += failed
+
+    def reset(self):
+        with self.lock:
+            self.latencies = []
+            self.errors = 0
+
+    def stats(self):
+        """Calls served, failures and server-side per-call latency percentiles (seconds)."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            errors = self.errors
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+        return {'calls': len(latencies), 'errors': errors, 'p50': pct(0.50), 'p99': pct(0.99)}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-ollama", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Ollama /api/generate server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", default="constant", choices=["constant", "uniform", "normal", "lognormal"])
+    parser.add_argument("--median", type=float, default=0.2, help="seconds")
+    parser.add_argument("--sigma", type=float, default=0.5)
+    parser.add_argument("--low", type=float, default=0.0)
+    parser.add_argument("--high", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    mock = MockOllama(args.host, args.port, Latency(args.latency, args.median, args.sigma, args.low, args.high),
+                      args.error_rate, args.hang_rate, args.hang_seconds, args.malformed_rate)
+    print(f"Mock Ollama listening on {mock.url} (Ctrl+C to stop)")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        st = mock.stats()
+        print(f"\n{st['calls']} calls, {st['errors']} errors, p50 {st['p50'] * 1000:.0f} ms, p99 {st['p99'] * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
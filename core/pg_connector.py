@@ -0,0 +1,287 @@
+import re
+
+import psycopg
+from psycopg_pool import ConnectionPool
+
+from core.db_connector import Catalog, DBConnector, LoadSession, RestoreError
+
+# Session settings for a bulk load, reset when it closes
+LOAD_SETTINGS = {
+    'synchronous_commit': 'off',
+    'maintenance_work_mem': '256MB',
+}
+
+COLUMNS_QUERY = """
+    SELECT c.ordinal_position - 1, c.column_name, c.data_type,
+           (c.is_nullable = 'NO')::int, c.column_default,
+           (EXISTS (SELECT 1 FROM pg_index i
+                    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+                    WHERE i.indrelid = %s::regclass AND i.indisprimary AND a.attname = c.column_name))::int
+    FROM information_schema.columns c
+    WHERE c.table_schema = current_schema() AND c.table_name = %s
+    ORDER BY c.ordinal_position
+"""
+
+FOREIGN_KEYS_QUERY = """
+    SELECT a.attname, parent.relname, pa.attname
+    FROM pg_constraint con
+    JOIN pg_class parent ON parent.oid = con.confrelid
+    JOIN LATERAL unnest(con.conkey, con.confkey) AS k(col, parent_col) ON true
+    JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.col
+    JOIN pg_attribute pa ON pa.attrelid = con.confrelid AND pa.attnum = k.parent_col
+    WHERE con.contype = 'f' AND con.conrelid = %s::regclass
+"""
+
+# Non-unique indexes of the tables (unique ones stay during a load)
+INDEXES_QUERY = """
+    SELECT i.indexname, i.indexdef FROM pg_indexes i
+    WHERE i.schemaname = current_schema() AND i.tablename = ANY(%s)
+      AND i.indexdef NOT LIKE 'CREATE UNIQUE %%'
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint c
+                      WHERE c.conindid = format('%%I.%%I', i.schemaname, i.indexname)::regclass)
+"""
+
+FOREIGN_KEY_DEFS_QUERY = """
+    SELECT rel.relname, con.conname, pg_get_constraintdef(con.oid)
+    FROM pg_constraint con JOIN pg_class rel ON rel.oid = con.conrelid
+    WHERE con.contype = 'f' AND rel.relnamespace = current_schema()::regnamespace AND rel.relname = ANY(%s)
+"""
+
+def to_postgres_ddl(sql):
+    """Translates the SQLite domain DDL: AUTOINCREMENT keys become identities, REAL becomes double precision."""
+    sql = sql.replace("INTEGER PRIMARY KEY AUTOINCREMENT", "INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY")
+    return re.sub(r"\bREAL\b", "DOUBLE PRECISION", sql)
+
+class PostgresLoadSession(LoadSession):
+    """
+    Postgres bulk load: one pooled connection for the whole load, with
+    synchronous_commit off. Every batch is streamed through
+    COPY ... FROM STDIN, in text or binary format. Binary needs Python
+    values matching the column types, which the domain tables satisfy.
+    Each batch runs under a savepoint, so a failed one leaves the rest of
+    the transaction usable.
+    """
+    def __init__(self, pool, commit_every=0, copy_format='text', settings=None, row_counts=None):
+        super().__init__(commit_every, row_counts)
+        self.pool = pool
+        self.copy_format = copy_format
+        self.types = {}
+        self.conn = pool.getconn()
+        self.settings = settings if settings is not None else LOAD_SETTINGS
+        for name, value in self.settings.items():
+            self.conn.execute(f"SET {name} = '{value}'")
+
+    def statement(self, table_name, columns):
+        key = (table_name, tuple(columns))
+        query = self.statements.get(key)
+        if query is None:
+            query = f"COPY {table_name} ({', '.join(columns)}) FROM STDIN"
+            if self.copy_format == 'binary':
+                query += " (FORMAT BINARY)"
+                # Binary COPY must be told each column's type
+                types = {row[1]: row[2] for row in column_rows(self.conn, table_name)}
+                self.types[key] = [types[c] for c in columns]
+            self.statements[key] = query
+        return query
+
+    def insert(self, table_name, columns, data_chunk):
+        """Streams a batch through COPY inside the open transaction; returns the row count."""
+        query = self.statement(table_name, columns)
+        self.mark(table_name)
+        self.conn.execute("SAVEPOINT batch")
+        try:
+            with self.conn.cursor() as cur:
+                with cur.copy(query) as copy:
+                    if self.copy_format == 'binary':
+                        copy.set_types(self.types[(table_name, tuple(columns))])
+                    for row in data_chunk:
+                        copy.write_row(row)
+        except psycopg.Error:
+            self.conn.execute("ROLLBACK TO SAVEPOINT batch")
+            raise
+        self.conn.execute("RELEASE SAVEPOINT batch")
+        return self.written(table_name, len(data_chunk))
+
+    def last_key(self, table_name):
+        """(integer primary key, its current maximum), or None when the table has none."""
+        for row in column_rows(self.conn, table_name):
+            if row[5] and row[2] in ('smallint', 'integer', 'bigint'):
+                return (row[1], self.conn.execute(f"SELECT COALESCE(MAX({row[1]}), 0) FROM {table_name}").fetchone()[0])
+        return None
+
+    def delete_after(self, table_name, key, last):
+        return self.conn.execute(f"DELETE FROM {table_name} WHERE {key} > %s", (last,)).rowcount
+
+    def suspend_constraints(self, tables):
+        """
+        Postgres counterpart of BulkLoadSession.suspend_constraints: drops
+        the tables' secondary indexes and foreign keys (keeping their
+        definitions) and disables their user triggers.
+        """
+        self.commit()
+        tables = list(tables)
+        self.suspended_fks = self.conn.execute(FOREIGN_KEY_DEFS_QUERY, (tables,)).fetchall()
+        for table, name, _ in self.suspended_fks:
+            self.conn.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+        for name, sql in self.conn.execute(INDEXES_QUERY, (tables,)).fetchall():
+            self.conn.execute(f'DROP INDEX "{name}"')
+            self.suspended.append(sql)
+        for table in tables:
+            self.conn.execute(f"ALTER TABLE {table} DISABLE TRIGGER USER")
+        self.suspended_tables = tables
+        self.conn.commit()
+
+    def restore_constraints(self):
+        """
+        Rebuilds the indexes, re-enables the triggers and re-adds each foreign
+        key, which validates it over the loaded rows in one pass. A key that
+        fails is re-added NOT VALID so the schema is unchanged.
+        Returns the violations as (table, constraint, message) rows. An index
+        that cannot be rebuilt raises RestoreError once the rest is restored.
+        """
+        self.commit()
+        failed = []
+        for sql in self.suspended:
+            try:
+                self.conn.execute(sql)
+                self.conn.commit()
+            except psycopg.Error as e:
+                self.conn.rollback()
+                failed.append((sql, str(e).strip()))
+        for table in getattr(self, 'suspended_tables', []):
+            self.conn.execute(f"ALTER TABLE {table} ENABLE TRIGGER USER")
+        self.conn.commit()
+        violations = []
+        for table, name, definition in getattr(self, 'suspended_fks', []):
+            try:
+                self.conn.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}')
+                self.conn.commit()
+            except psycopg.errors.ForeignKeyViolation as e:
+                self.conn.rollback()
+                self.conn.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition} NOT VALID')
+                self.conn.commit()
+                violations.append((table, name, str(e).strip()))
+        self.suspended, self.suspended_tables, self.suspended_fks = [], [], []
+        if failed:
+            raise RestoreError(failed, violations)
+        return violations
+
+    def close(self):
+        """Commits what was written, resets the session settings and returns the connection to the pool."""
+        if self.conn is None:
+            return
+        try:
+            self.commit()
+            for name in self.settings:
+                self.conn.execute(f"RESET {name}")
+            self.conn.commit()
+        finally:
+            self.pool.putconn(self.conn)
+            self.conn = None
+
+def column_rows(conn, table_name):
+    return conn.execute(COLUMNS_QUERY, (table_name, table_name)).fetchall()
+
+class PostgresConnector(DBConnector):
+    """
+    PostgreSQL backend (database.backend: postgres). Connections come from a
+    psycopg pool built from the `database` section (or its `dsn`); schema
+    introspection uses information_schema and pg_catalog instead of PRAGMA.
+    """
+    dialect = 'postgres'
+
+    def __init__(self, config):
+        super().__init__(config)
+        db = self.config
+        self.dsn = db.get('dsn') or psycopg.conninfo.make_conninfo(
+            host=db.get('host', 'localhost'), port=db.get('port', 5432), user=db.get('user'),
+            password=db.get('password'), dbname=db.get('dbname'))
+        self.copy_format = db.get('copy_format', 'text')
+        self.pool = ConnectionPool(self.dsn, min_size=1, max_size=db.get('pool_size', 4), open=True)
+
+    def close(self):
+        self.pool.close()
+
+    def init_domain(self, domain_name):
+        """Reset and initialize a specific domain schema."""
+        if domain_name not in self.DOMAINS:
+            return False
+
+        with self.pool.connection() as conn:
+            for table in self.fetch_tables():
+                conn.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+            for sql in self.DOMAINS[domain_name]:
+                conn.execute(to_postgres_ddl(sql))
+        self.row_counts.reset()
+        return True
+
+    def get_connection(self):
+        """A pooled connection; use as `with db.get_connection() as conn` to return it."""
+        return self.pool.connection()
+
+    def bulk_insert(self, table_name, columns, data_chunk):
+        """Bulk insert through COPY, committed on its own."""
+        try:
+            with PostgresLoadSession(self.pool, copy_format=self.copy_format, row_counts=self.row_counts) as session:
+                return session.insert(table_name, columns, data_chunk)
+        except psycopg.Error:
+            return 0
+
+    def bulk_load(self, commit_every=None, pragmas=None):
+        """
+        Opens a COPY-based bulk-load session (see PostgresLoadSession).
+        pragmas: session settings to use instead of LOAD_SETTINGS.
+        """
+        if commit_every is None:
+            commit_every = self.load_config.get('commit_every', 0)
+        return PostgresLoadSession(self.pool, commit_every, self.copy_format, pragmas, self.row_counts)
+
+    def staged_build(self, where=None):
+        """Loads always write to the server in place."""
+        return None
+
+    def shards(self):
+        """The server takes concurrent writers itself; loads are never sharded."""
+        return None
+
+    def catalog(self):
+        """
+        The schema snapshot, read over one pooled connection. Postgres has no
+        schema_version to validate a cached copy against, so it is not cached.
+        """
+        columns, foreign_keys = {}, {}
+        with self.pool.connection() as conn:
+            for table in self.fetch_tables():
+                columns[table] = column_rows(conn, table)
+                foreign_keys[table] = conn.execute(FOREIGN_KEYS_QUERY, (table,)).fetchall()
+        return Catalog(columns, foreign_keys)
+
+    def fetch_tables(self):
+        """Tables of the current schema."""
+        rows = self.execute_query(
+            "SELECT table_name FROM information_schema.tables "
+            "WHERE table_schema = current_schema() AND table_type = 'BASE TABLE'"
+        )
+        return [row[0] for row in rows]
+
+    def table_columns(self, table_name):
+        """(cid, name, type, notnull, dflt_value, pk) per column, in the shape of SQLite's PRAGMA table_info."""
+        with self.pool.connection() as conn:
+            return column_rows(conn, table_name)
+
+    def foreign_keys(self, table_name):
+        """(column, parent_table, parent_column) per declared foreign key."""
+        return self.execute_query(FOREIGN_KEYS_QUERY, (table_name,))
+
+    def estimate_rows(self, table_name):
+        """The planner's estimate: pg_class.reltuples, or the live tuples the stats collector saw."""
+        rows = self.execute_query(
+            "SELECT GREATEST(c.reltuples, COALESCE(s.n_live_tup, 0))::bigint FROM pg_class c "
+            "LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid WHERE c.oid = %s::regclass", (table_name,))
+        return rows[0][0] if rows else 0
+
+    def execute_query(self, query, params=None):
+        with self.pool.connection() as conn:
+            cur = conn.execute(query, params)
+            if cur.description:
+                return cur.fetchall()
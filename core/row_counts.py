@@ -0,0 +1,54 @@
+import threading
+
+class RowCounts:
+    """
+    Row counts per table, kept without COUNT(*) scans.
+
+    A table's count starts from the connector's cheap estimate
+    (DBConnector.estimate_rows) the first time it is asked for; from then on
+    load sessions add their rows as they commit, so reading a count is O(1).
+    recount() runs the exact COUNT(*) when asked to. Rows written outside a
+    load session, or by another process, show up after recount() or reset().
+    """
+    def __init__(self, db):
+        self.db = db
+        self.counts = {}
+        self.exact = set()
+        # Load sessions commit while holding this lock, so a count is never
+        # estimated from data whose commit is still to be added
+        self.lock = threading.RLock()
+
+    def get(self, table_name):
+        with self.lock:
+            if table_name not in self.counts:
+                self.counts[table_name] = self.db.estimate_rows(table_name)
+            return self.counts[table_name]
+
+    def snapshot(self, tables):
+        """{table: count} for the tables."""
+        return {table: self.get(table) for table in tables}
+
+    def is_exact(self, table_name):
+        """True once the table was recounted; added rows keep it exact."""
+        return table_name in self.exact
+
+    def committed(self, rows_by_table):
+        """Adds rows a load session just committed (call with the lock held)."""
+        for table_name, rows in rows_by_table.items():
+            # A table not counted yet gets these rows from its first estimate
+            if table_name in self.counts:
+                self.counts[table_name] += rows
+
+    def recount(self, tables):
+        """Exact COUNT(*) of the tables; returns {table: count}."""
+        with self.lock:
+            for table_name in tables:
+                self.counts[table_name] = self.db.execute_query(f"SELECT COUNT(*) FROM {table_name}")[0][0]
+                self.exact.add(table_name)
+            return {table_name: self.counts[table_name] for table_name in tables}
+
+    def reset(self):
+        """Forgets every count, e.g. after the database file was replaced."""
+        with self.lock:
+            self.counts = {}
+            self.exact = set()
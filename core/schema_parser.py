@@ -11,30 +11,33 @@ class SchemaParser:
         Analyzes FK constraints to build a table dependency graph.
         Returns a topologically sorted list of tables.
         """
-        # Get all tables
-        tables = self.db.fetch_tables()
+        # Tables and foreign keys from one schema snapshot
+        catalog = self.db.catalog()
+        tables = catalog.tables
         self.graph.add_nodes_from(tables)
 
-        # For SQLite, we need to query each table's foreign keys separately
         for table in tables:
             try:
-                fk_query = f"PRAGMA foreign_key_list({table});"
-                fk_relations = self.db.execute_query(fk_query)
-                if fk_relations:
-                    for fk in fk_relations:
-                        parent_table = fk[2]  # 'table' column in PRAGMA result
-                        if parent_table != table:  # Ignore self-referencing
-                            self.graph.add_edge(parent_table, table)  # Parent -> Child
+                for _, parent_table, _ in catalog.foreign_keys.get(table, []):
+                    if parent_table != table:  # Ignore self-referencing
+                        self.graph.add_edge(parent_table, table)  # Parent -> Child
             except Exception as e:
                 print(f"Error parsing FK for {table}: {e}")
 
         return list(nx.topological_sort(self.graph))
 
+    def get_generations(self):
+        """
+        Groups tables by topological generation: every table in a group only
+        depends on tables of earlier groups, so a group can be seeded in parallel.
+        Call after build_dependency_graph().
+        """
+        return [sorted(generation) for generation in nx.topological_generations(self.graph)]
+
     def get_table_columns(self, table_name):
         """Returns list of (column_name, data_type, is_nullable) for a table."""
-        query = f"PRAGMA table_info({table_name});"
-        result = self.db.execute_query(query)
-        # PRAGMA table_info returns: (cid, name, type, notnull, dflt_value, pk)
+        result = self.db.table_columns(table_name)
+        # Rows in PRAGMA table_info's shape: (cid, name, type, notnull, dflt_value, pk)
         columns = []
         if result:
             for row in result:
@@ -47,14 +50,17 @@ class SchemaParser:
                 columns.append((col_name, col_type, is_nullable))
         return columns
 
-    def get_table_stats(self):
-        """Returns a dict {table_name: row_count}."""
+    def get_table_stats(self, exact=False):
+        """
+        Returns a dict {table_name: row_count} from the connector's row
+        counters (see RowCounts), without scanning the tables.
+        exact: recount every table with COUNT(*) first
+        """
+        counts = self.db.row_counts
         stats = {}
         for node in self.graph.nodes:
             try:
-                res = self.db.execute_query(f"SELECT COUNT(*) FROM {node}")
-                if res:
-                    stats[node] = res[0][0]
+                stats[node] = counts.recount([node])[node] if exact else counts.get(node)
             except Exception:
                 stats[node] = 0
         return stats
@@ -0,0 +1,116 @@
+import sys
+import time
+
+class BatchTuner:
+    """
+    Auto-tuning for batch_size and max_in_flight, driven by measured throughput.
+
+    Every window (at least `window` batches and `window_seconds`, after a first
+    warm-up window) it compares the end-to-end rows/s with the best seen
+    so far and keeps doubling (or halving) the batch size while that helps. When
+    a step makes things worse it goes back to the best size and tries the other
+    direction; after two misses in a row it settles. The in-flight depth follows
+    the bottleneck: deeper when the writer waits on generation, shallower when
+    inserts are the slow side. Both are capped so in-flight batches stay under
+    max_batch_mb of memory.
+    """
+    def __init__(self, batch_size, max_in_flight, workers, max_batch_mb=64,
+                 window=3, window_seconds=0.5, min_batch=10, max_batch=100000):
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.workers = workers
+        self.max_bytes = max_batch_mb * 1024 * 1024
+        self.window = window
+        self.window_seconds = window_seconds
+        self.warmed_up = False
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+
+        self.direction = 2.0
+        self.misses = 0
+        self.settled = False
+        self.best_rate = 0.0
+        self.best_size = batch_size
+        self.row_bytes = None
+
+        # Totals for the run summary
+        self.total_rows = 0
+        self.gen_seconds = 0.0
+        self.insert_seconds = 0.0
+        self.reset_window()
+
+    def reset_window(self):
+        self.window_rows = 0
+        self.window_batches = 0
+        self.window_wait = 0.0
+        self.window_insert = 0.0
+        self.window_start = time.time()
+
+    def estimate_row_bytes(self, chunk):
+        sample = chunk[:20]
+        total = sum(sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row) for row in sample)
+        return max(1, total // len(sample))
+
+    def record(self, chunk, gen_seconds, wait_seconds, insert_seconds):
+        """
+        Records one written batch.
+        chunk: its rows, or just their count when a worker wrote them to its shard
+        gen_seconds: time the worker spent building it
+        wait_seconds: time the parent waited for it
+        insert_seconds: time bulk_insert took
+        """
+        rows = chunk if isinstance(chunk, int) else len(chunk)
+        if not rows:
+            return
+        if self.row_bytes is None and not isinstance(chunk, int):
+            self.row_bytes = self.estimate_row_bytes(chunk)
+
+        self.total_rows += rows
+        self.gen_seconds += gen_seconds
+        self.insert_seconds += insert_seconds
+        self.window_rows += rows
+        self.window_batches += 1
+        self.window_wait += wait_seconds
+        self.window_insert += insert_seconds
+
+        if self.window_batches >= self.window and time.time() - self.window_start >= self.window_seconds:
+            if self.warmed_up:
+                self.adjust()
+            self.warmed_up = True
+            self.reset_window()
+
+    def adjust(self):
+        elapsed = max(time.time() - self.window_start, 1e-6)
+        rate = self.window_rows / elapsed
+
+        if not self.settled:
+            if rate > self.best_rate * 1.05:
+                self.best_rate = rate
+                self.best_size = self.batch_size
+                self.misses = 0
+            else:
+                self.misses += 1
+                self.direction = 1 / self.direction
+                if self.misses >= 2:
+                    self.settled = True
+            self.batch_size = self.best_size if self.settled else int(self.best_size * self.direction)
+
+        # Writer idle while waiting for workers -> generation-bound, queue more batches
+        if self.window_wait > self.window_insert:
+            self.max_in_flight = self.workers * 2
+        else:
+            self.max_in_flight = self.workers + 1
+
+        self.apply_limits()
+
+    def apply_limits(self):
+        max_rows = self.max_batch
+        if self.row_bytes:
+            max_rows = min(max_rows, self.max_bytes // (self.row_bytes * self.max_in_flight))
+        self.batch_size = max(self.min_batch, min(self.batch_size, max_rows))
+
+    def summary(self):
+        gen_rate = self.total_rows / self.gen_seconds if self.gen_seconds else 0
+        insert_rate = self.total_rows / self.insert_seconds if self.insert_seconds else 0
+        return (f"batch_size={self.batch_size} max_in_flight={self.max_in_flight} "
+                f"(generate {gen_rate:.0f} rows/s per worker, insert {insert_rate:.0f} rows/s)")
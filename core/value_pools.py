@@ -0,0 +1,129 @@
+import os
+import random
+import sys
+
+import numpy as np
+from faker import Faker
+
+fake = Faker()
+
+# Pools live per process: each generation worker grows them as it draws
+# values and keeps them for every following batch.
+_POOLS = {}
+_pools_pid = None
+
+DEFAULT_POOL_SIZE = 10000
+DEFAULT_POOL_MAX_MB = 16
+
+class ValuePool:
+    """
+    A pre-materialized list of Faker values sampled in O(1).
+    The pool grows with the values drawn from it, so it never costs more Faker
+    calls than it replaces, and stops at `size` values or `max_mb` megabytes.
+    """
+    def __init__(self, provider, kwargs=None, size=DEFAULT_POOL_SIZE, max_mb=DEFAULT_POOL_MAX_MB):
+        self.provider = provider
+        self.kwargs = kwargs or {}
+        self.size = size
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.values = [] # a list while growing, an object array once full
+        self.nbytes = 0
+        self.full = False
+
+    def grow(self, n):
+        """Adds up to n fresh Faker values and returns them."""
+        make = getattr(fake, self.provider)
+        fresh = []
+        while len(fresh) < n and len(self.values) + len(fresh) < self.size and self.nbytes < self.max_bytes:
+            val = make(**self.kwargs)
+            fresh.append(val)
+            self.nbytes += sys.getsizeof(val)
+        self.values.extend(fresh)
+        self.full = len(self.values) >= self.size or self.nbytes >= self.max_bytes
+        if self.full:
+            # Converted once, for sample_many's vectorized indexing
+            values = np.empty(len(self.values), dtype=object)
+            values[:] = self.values
+            self.values = values
+        return fresh
+
+    def fill(self):
+        self.grow(self.size)
+
+    def sample(self):
+        if not self.full:
+            fresh = self.grow(1)
+            if fresh:
+                return fresh[0]
+        return self.values[random.randrange(len(self.values))]
+
+    def sample_many(self, n, rng):
+        fresh = [] if self.full else self.grow(n)
+        if len(fresh) == n:
+            return fresh
+        return fresh + self.values[rng.integers(0, len(self.values), n - len(fresh))].tolist()
+
+class UniqueEmailPool(ValuePool):
+    """
+    Emails without repeats across a table: every address is tagged with the
+    worker's pid (jane.doe+4821@example.com), so workers never collide, and
+    the pool hands out distinct addresses while it grows. Once it is full it
+    is walked again with the pass number added (jane.doe+4821.2@example.com).
+    """
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_mb=DEFAULT_POOL_MAX_MB):
+        super().__init__('email', size=size, max_mb=max_mb)
+        self.seen = set()
+        self.position = 0
+        self.tag = os.getpid() # Faker local parts never contain '+'
+
+    def grow(self, n):
+        fresh = []
+        attempts = 0
+        while len(fresh) < n and len(self.values) < self.size and self.nbytes < self.max_bytes and attempts < n * 10:
+            val = fake.email()
+            attempts += 1
+            if val not in self.seen:
+                self.seen.add(val)
+                local, domain = val.split('@', 1)
+                self.values.append((local, domain))
+                self.nbytes += sys.getsizeof(val)
+                fresh.append(f"{local}+{self.tag}@{domain}")
+        self.full = len(self.values) >= self.size or self.nbytes >= self.max_bytes or len(fresh) < n
+        return fresh
+
+    def sample(self):
+        if not self.full:
+            fresh = self.grow(1)
+            if fresh:
+                return fresh[0]
+        cycle, idx = divmod(self.position, len(self.values))
+        self.position += 1
+        local, domain = self.values[idx]
+        return f"{local}+{self.tag}.{cycle + 2}@{domain}"
+
+    def sample_many(self, n, rng):
+        return [self.sample() for _ in range(n)]
+
+def get_pool(provider, kwargs=None, settings=None):
+    """Returns this process's pool for a Faker provider, creating it on first use."""
+    global _pools_pid
+    if _pools_pid != os.getpid():
+        # Forked workers inherit the parent's pools and Faker state; start fresh
+        _POOLS.clear()
+        fake.seed_instance(int.from_bytes(os.urandom(8), 'little'))
+        _pools_pid = os.getpid()
+
+    settings = settings or {}
+    kwargs = kwargs or {}
+    unique = provider == 'email' and settings.get('unique_emails', False)
+    key = (provider, tuple(sorted(kwargs.items())), unique)
+    pool = _POOLS.get(key)
+    if pool is None:
+        size = settings.get('size', DEFAULT_POOL_SIZE)
+        max_mb = settings.get('max_mb', DEFAULT_POOL_MAX_MB)
+        if unique:
+            pool = UniqueEmailPool(size=size, max_mb=max_mb)
+        else:
+            pool = ValuePool(provider, kwargs, size=size, max_mb=max_mb)
+        _POOLS[key] = pool
+    return pool
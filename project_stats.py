@@ -1,30 +1,24 @@
+import argparse
 import os
-import sqlite3
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 
+from core.db_connector import DBConnector
+
 console = Console()
 
-def get_db_stats():
+def get_db_stats(exact=False):
+    """(table, rows) per table: cheap estimates (see RowCounts), or COUNT(*) with exact."""
     db_path = "dataforge.db"
     if not os.path.exists(db_path):
         return None
     
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = [t[0] for t in cursor.fetchall() if t[0] != 'sqlite_sequence']
-    
-    stats = []
-    for table in tables:
-        cursor.execute(f"SELECT COUNT(*) FROM {table}")
-        count = cursor.fetchone()[0]
-        stats.append((table, count))
-    
-    conn.close()
-    return stats
+    db = DBConnector({})
+    db.db_path = db_path
+    tables = db.fetch_tables()
+    counts = db.row_counts.recount(tables) if exact else db.row_counts.snapshot(tables)
+    return list(counts.items())
 
 def get_export_stats():
     export_dir = "exports"
@@ -35,15 +29,19 @@ def get_export_stats():
     return [(f, os.path.getsize(os.path.join(export_dir, f))) for f in files]
 
 def main():
+    parser = argparse.ArgumentParser(description="DataForge project status")
+    parser.add_argument("--exact", action="store_true", help="count rows with COUNT(*) instead of estimating")
+    args = parser.parse_args()
+
     console.clear()
     console.print(Panel.fit("[bold cyan]📊 DATAFORAGE PROJECT STATUS[/bold cyan]", border_style="blue"))
     
     # DB Stats
-    db_stats = get_db_stats()
+    db_stats = get_db_stats(args.exact)
     if db_stats:
         table = Table(title="Database Inventory", show_header=True, header_style="bold green")
         table.add_column("Table Name", style="cyan")
-        table.add_column("Row Count", justify="right", style="magenta")
+        table.add_column("Row Count" if args.exact else "Row Count (est.)", justify="right", style="magenta")
         
         for name, count in db_stats:
             table.add_row(name, str(count))
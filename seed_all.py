@@ -2,7 +2,7 @@
 import sys
 sys.path.insert(0, '.')
 
-from core.db_connector import DBConnector
+from core.db_connector import create_connector
 from core.schema_parser import SchemaParser
 from core.generator import DataGenerator
 import yaml
@@ -11,12 +11,12 @@ import yaml
 with open("config/settings.yaml", "r") as f:
     config = yaml.safe_load(f)
 
-# Override to disable AI for speed
+# Override to disable AI for speed and let the generator pick batch sizes
 config['generation']['use_ai_mode'] = False
-config['generation']['batch_size'] = 50
+config['generation']['autotune'] = True
 
 print("Connecting to database...")
-db = DBConnector(config)
+db = create_connector(config)
 print("Connected!")
 
 print("\nParsing schema...")
@@ -24,16 +24,16 @@ parser = SchemaParser(db)
 sorted_tables = parser.build_dependency_graph()
 print("Tables:", sorted_tables)
 
+def table_done(table, rows, error):
+    if error:
+        print(f"  ✗ {table}: {error}")
+    else:
+        print(f"  ✓ {table} done!")
+
 print("\n🔥 Seeding ALL tables (100 rows each)...")
-generator = DataGenerator(db, config)
-
-for table in sorted_tables:
-    print(f"  Seeding {table}...", end=" ")
-    try:
-        generator.seed_table(table, 100)
-        print("✓ Done!")
-    except Exception as e:
-        print(f"✗ Error: {e}")
+with DataGenerator(db, config) as generator:
+    # Independent tables (e.g. users and products) are seeded at the same time
+    generator.seed_tables(parser.get_generations(), 100, on_table_done=table_done)
 
 print("\n📊 Final row counts:")
 stats = parser.get_table_stats()
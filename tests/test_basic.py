@@ -1,15 +1,87 @@
 import unittest
 import sys
 import os
+import sqlite3
+import tempfile
+import json
+import threading
+import time
+import socket
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from unittest.mock import MagicMock, patch
-from core.db_connector import DBConnector
+from core.db_connector import DBConnector, BatchWriter, ForeignKeyError, RestoreError, Shards, create_connector
 from core.schema_parser import SchemaParser
-from core.generator import DataGenerator, generate_row
-from core.ai_agent import AIAgent
+from core.generator import DataGenerator, SeedingCancelled, TableSkipped, generate_row, get_ai_agent, get_async_ai_client, cancel_ai_requests, ai_worker_stats, compile_column_plan, generate_chunk, Choice, FloatRange, FakerValue
+from core.ai_agent import AIAgent, parse_batch_reply
+from core.ai_cache import ResponseCache, TOUCH_INTERVAL
+from core.ai_prefetch import AIPrefetcher, CircuitBreaker
+from core.mock_ollama import MockOllama, Latency
+from core.value_pools import ValuePool, UniqueEmailPool
+from core.tuning import BatchTuner
+from core.key_index import KeyIndex
+from core.distributions import AliasTable, SkewedKey, WeightedChoice, NumericDistribution
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Minimal keep-alive stand-in for Ollama's /api/generate."""
+    protocol_version = "HTTP/1.1"
+    reply = "\"Chest pain\""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({"response": self.reply}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class FakeOllamaBatchHandler(FakeOllamaHandler):
+    reply = 'Sure! ["Flu", "Asthma", "flu", "", "Migraine"]'
+
+class FakeOllamaSlowHandler(FakeOllamaHandler):
+    """Slow replies; the first request fails, and the peak concurrency is recorded."""
+    delay = 0.2
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+    requests = 0
+
+    def do_POST(self):
+        cls = type(self)
+        with cls.lock:
+            cls.requests += 1
+            first = cls.requests == 1
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        time.sleep(cls.delay)
+        with cls.lock:
+            cls.active -= 1
+        if first:
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        super().do_POST()
 
 class TestDataForge(unittest.TestCase):
+    def setUp(self):
+        # Keep schema snapshots and domain templates out of the repo's .dataforge_cache
+        cache = tempfile.TemporaryDirectory()
+        self.addCleanup(cache.cleanup)
+        self.catalog_dir = os.path.join(cache.name, 'catalog')
+        for name, path in (('DEFAULT_CATALOG_DIR', self.catalog_dir),
+                           ('DEFAULT_TEMPLATE_DIR', os.path.join(cache.name, 'templates'))):
+            patcher = patch(f'core.db_connector.{name}', path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
     def test_imports(self):
         self.assertTrue(True)
 
@@ -32,6 +104,7 @@ class TestDataForge(unittest.TestCase):
         row = generate_row(columns, ai_config=None)
         self.assertIsInstance(row[0], str) # It returns str(date)
 
+    @patch.dict('core.generator._agents', clear=True) # No agent cached before (or with) the mock
     @patch('core.generator.AIAgent')
     def test_generate_row_with_ai_mock(self, MockAIAgent):
         """Test generation with AI mock returning None (should trigger fallback)."""
@@ -49,5 +122,809 @@ class TestDataForge(unittest.TestCase):
         self.assertIsInstance(row[0], str)
         self.assertNotEqual(row[0], "N/A")
 
+    def test_compile_column_plan(self):
+        """Test that columns are classified once into the expected producers."""
+        columns = [
+            ('department', 'text', True),
+            ('patient_id', 'integer', True),
+            ('cost', 'real', True),
+            ('email', 'text', True),
+            ('product_id', 'integer', True),
+        ]
+        plan = compile_column_plan(columns)
+        self.assertIsInstance(plan[0], Choice)
+        self.assertEqual((plan[1].low, plan[1].high), (1, 100))
+        self.assertIsInstance(plan[2], FloatRange)
+        self.assertEqual((plan[2].low, plan[2].high), (10.0, 5000.0))
+        self.assertIsInstance(plan[3], FakerValue)
+        self.assertEqual(plan[3].provider, 'email')
+        self.assertEqual((plan[4].low, plan[4].high), (1, 1000))
+
+        row = generate_row(columns, plan=plan)
+        self.assertEqual(len(row), 5)
+        self.assertIn('@', row[3])
+
+    def test_columnar_chunk(self):
+        """Test that columnar mode yields rows of plain Python values within the same ranges."""
+        columns = [
+            ('sensor_id', 'integer', True),
+            ('timestamp', 'datetime', True),
+            ('value', 'real', True),
+            ('unit', 'text', True),
+            ('is_fraud', 'integer', True),
+        ]
+        plan = compile_column_plan(columns)
+        chunk = generate_chunk(200, plan, columnar=True)
+        self.assertEqual(len(chunk), 200)
+        for sensor_id, timestamp, value, unit, is_fraud in chunk:
+            self.assertIs(type(sensor_id), int)
+            self.assertTrue(1 <= sensor_id <= 100)
+            self.assertIs(type(timestamp), str)
+            self.assertEqual(timestamp[10], ' ')
+            self.assertIs(type(value), float)
+            self.assertTrue(-20.0 <= value <= 150.0)
+            self.assertIn(unit, plan[3].options)
+            self.assertIn(is_fraud, (0, 1))
+
+    def test_value_pools(self):
+        """Test that pools respect their size cap and unique emails never repeat."""
+        pool = ValuePool('city', size=50)
+        pool.fill()
+        self.assertEqual(len(pool.values), 50)
+        self.assertIn(pool.sample(), list(pool.values))
+
+        emails = UniqueEmailPool(size=20)
+        emails.fill()
+        drawn = [emails.sample() for _ in range(100)]
+        self.assertEqual(len(set(drawn)), 100)
+        self.assertTrue(all('@' in e for e in drawn))
+
+        # Workers draw the same Faker emails but tag them with their own pid
+        from core.value_pools import fake
+        drawn = []
+        for tag in (101, 102):
+            fake.seed_instance(3)
+            worker_pool = UniqueEmailPool(size=20)
+            worker_pool.tag = tag
+            drawn += [worker_pool.sample() for _ in range(50)]
+        self.assertEqual(len(set(drawn)), 100)
+
+        plan = compile_column_plan([('email', 'text', True), ('name', 'text', True)],
+                                   pool_config={'enabled': True, 'size': 30})
+        chunk = generate_chunk(100, plan, columnar=True)
+        self.assertEqual(len(chunk), 100)
+        self.assertLessEqual(len({row[1] for row in chunk}), 30)
+
+    def test_seed_table_exact_count(self):
+        """Test that seed_table writes exactly the requested rows when they don't divide into batches."""
+        db = MagicMock()
+        table_info = [(0, 'id', 'INTEGER', 0, None, 1), (1, 'score', 'INTEGER', 0, None, 0)]
+        db.table_columns.return_value = table_info
+        db.foreign_keys.return_value = []
+        config = {'generation': {'batch_size': 10, 'workers': 2, 'use_ai_mode': False}}
+        with DataGenerator(db, config) as generator:
+            written = generator.seed_table('grades', 95)
+        self.assertEqual(written, 95)
+        writer = db.writer.return_value
+        inserted = sum(len(call.args[2]) for call in writer.put.call_args_list)
+        self.assertEqual(inserted, 95)
+        writer.end_table.assert_called_once_with('grades')
+        writer.close.assert_called_once()
+        db.bulk_load.return_value.close.assert_called_once()
+
+    def test_seed_table_propagates_worker_errors(self):
+        """Test that a failing batch raises instead of blocking forever."""
+        db = MagicMock()
+        table_info = [(0, 'score', 'INTEGER', 0, None, 0)]
+        db.table_columns.return_value = table_info
+        db.foreign_keys.return_value = []
+        config = {'generation': {'batch_size': 10, 'workers': 1, 'use_ai_mode': False}}
+        with DataGenerator(db, config) as generator:
+            with patch('core.generator.IntRange.__call__', side_effect=ValueError("boom")):
+                with self.assertRaises(ValueError):
+                    generator.seed_table('grades', 20)
+
+            with patch('core.generator.cancel_ai_requests') as cancel_requests:
+                generator.cancel()
+            cancel_requests.assert_called_once()
+            with self.assertRaises(SeedingCancelled):
+                generator.seed_table('grades', 20)
+
+    @patch('core.tuning.time.time')
+    def test_batch_tuner(self, mock_time):
+        """Test that the tuner grows batches while throughput improves and respects the memory cap."""
+        mock_time.return_value = 0.0
+        tuner = BatchTuner(100, 4, workers=2, window=1, window_seconds=0)
+        chunk = [(1, 'x')] * 100
+        tuner.record(chunk, 0.1, 0.5, 0.1) # warm-up window
+        self.assertEqual(tuner.batch_size, 100)
+
+        # Throughput improves -> keep doubling
+        mock_time.return_value = 1.0
+        tuner.record(chunk, 0.1, 0.5, 0.1)
+        self.assertEqual(tuner.batch_size, 200)
+        self.assertEqual(tuner.max_in_flight, 4) # waiting on workers -> workers * 2
+
+        # Throughput drops -> back to the best size, then settle
+        mock_time.return_value = 3.0
+        tuner.record(chunk, 0.1, 0.0, 0.5)
+        self.assertEqual(tuner.batch_size, 50)
+        self.assertEqual(tuner.max_in_flight, 3)
+        mock_time.return_value = 5.0
+        tuner.record(chunk, 0.1, 0.0, 0.5)
+        self.assertTrue(tuner.settled)
+        self.assertEqual(tuner.batch_size, 100)
+
+        # Sharded batches are recorded by their row count
+        sharded = BatchTuner(100, 4, workers=2, window=1, window_seconds=0)
+        sharded.record(100, 0.1, 0.5, 0.0)
+        self.assertEqual((sharded.total_rows, sharded.row_bytes), (100, None))
+
+        capped = BatchTuner(100000, 4, workers=2, max_batch_mb=1)
+        capped.row_bytes = 1024
+        capped.apply_limits()
+        self.assertEqual(capped.batch_size, 256)
+
+    def test_seed_tables_by_generation(self):
+        """Test that independent tables share a generation and every table gets seeded."""
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DBConnector({})
+            db.db_path = os.path.join(tmp, 'test.db')
+            db.init_domain('E-commerce')
+            parser = SchemaParser(db)
+            parser.build_dependency_graph()
+            generations = parser.get_generations()
+            self.assertEqual(generations, [['products', 'users'], ['orders']])
+
+            config = {'generation': {'batch_size': 7, 'workers': 2, 'use_ai_mode': False}}
+            done = []
+            with DataGenerator(db, config) as generator:
+                results = generator.seed_tables(generations, {'users': 30, 'products': 20, 'orders': 50},
+                                                on_table_done=lambda t, rows, err: done.append((t, err)))
+            self.assertEqual(results, {'users': 30, 'products': 20, 'orders': 50})
+            self.assertEqual(done[-1], ('orders', None))
+            self.assertEqual(parser.get_table_stats(), results)
+
+            # Every order points at an existing user and product
+            orphans = db.execute_query(
+                "SELECT COUNT(*) FROM orders WHERE user_id NOT IN (SELECT id FROM users) "
+                "OR product_id NOT IN (SELECT id FROM products)")
+            self.assertEqual(orphans[0][0], 0)
+
+    def test_key_index_runs(self):
+        """Test that keys with gaps are stored as runs and only existing keys are sampled."""
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DBConnector({})
+            db.db_path = os.path.join(tmp, 'test.db')
+            db.execute_query("CREATE TABLE parents (id INTEGER PRIMARY KEY, name TEXT)")
+            with db.get_connection() as conn:
+                conn.executemany("INSERT INTO parents (id) VALUES (?)",
+                                 [(i,) for i in list(range(1, 11)) + list(range(50, 61))])
+            index = KeyIndex.from_table(db, 'parents', 'id')
+            self.assertEqual(len(index), 21)
+            self.assertEqual(index.starts.tolist(), [1, 50])
+            valid = set(range(1, 11)) | set(range(50, 61))
+            self.assertTrue(set(index.sample_many(500, np.random.default_rng()).tolist()) <= valid)
+            self.assertIn(index.sample(), valid)
+
+    def test_distributions(self):
+        """Test alias-table sampling and that column specs replace the uniform producers."""
+        rng = np.random.default_rng(7)
+        table = AliasTable([1, 2, 7])
+        draws = table.sample_many(100000, rng)
+        self.assertAlmostEqual((draws == 2).mean(), 0.7, delta=0.02)
+        self.assertAlmostEqual((draws == 0).mean(), 0.1, delta=0.02)
+
+        columns = [('user_id', 'integer', True), ('department', 'text', True), ('amount', 'real', True)]
+        plan = compile_column_plan(
+            columns,
+            foreign_keys={'user_id': KeyIndex([1], [1000])},
+            distributions={
+                'user_id': {'kind': 'zipf', 's': 1.2},
+                'department': {'kind': 'weighted', 'weights': {'ER': 10}},
+                'amount': {'kind': 'lognormal', 'mean': 3, 'sigma': 1, 'min': 1, 'max': 500},
+            })
+        self.assertIsInstance(plan[0], SkewedKey)
+        self.assertIsInstance(plan[1], WeightedChoice)
+        self.assertIsInstance(plan[2], NumericDistribution)
+
+        chunk = generate_chunk(5000, plan, columnar=True)
+        user_ids = [row[0] for row in chunk]
+        self.assertTrue(all(1 <= u <= 1000 for u in user_ids))
+        # Key 1 is the hottest under zipf
+        self.assertGreater(user_ids.count(1), len(user_ids) / 10)
+        self.assertGreater([row[1] for row in chunk].count('ER'), 2500)
+        self.assertTrue(all(1 <= row[2] <= 500 for row in chunk))
+        self.assertIn(plan[1](), plan[1].options)
+
+        # Row mode on a text key
+        codes = SkewedKey(KeyIndex(values=np.array(['AA', 'BB', 'CC'], dtype=object)), {'kind': 'pareto', 'alpha': 1.5})
+        self.assertIn(codes(), ['AA', 'BB', 'CC'])
+        self.assertIsInstance(plan[0](), int)
+
+    def test_ai_agent_reuses_connections(self):
+        """Test that one agent per process serves every AI cell over a single keep-alive connection."""
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllamaHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            ai_config = {'enabled': True, 'api_url': f'http://127.0.0.1:{server.server_port}/api/generate', 'model': 'test'}
+            plan = compile_column_plan([('diagnosis', 'text', True)], ai_config=ai_config)
+            rows = [generate_row(None, plan=plan) for _ in range(5)]
+            self.assertEqual(rows[0], ('Chest pain',))
+
+            agent = get_ai_agent(ai_config)
+            stats = agent.get_stats()
+            self.assertEqual(stats['calls'], 5)
+            self.assertEqual(stats['errors'], 0)
+            self.assertEqual(stats['connections'], 1)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_response_cache(self):
+        """Test that the LLM cache collects variants per prompt, serves them and evicts by LRU."""
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(os.path.join(tmp, 'llm.db'), max_entries=3, variants=2)
+            self.assertIsNone(cache.get('m', 'diagnosis'))
+            cache.put('m', 'diagnosis', 'Flu')
+            self.assertIsNone(cache.get('m', 'diagnosis'))
+            cache.put('m', 'diagnosis', 'Asthma')
+            cache.put('m', 'diagnosis', 'Migraine') # already has its 2 variants
+            self.assertIn(cache.get('m', 'diagnosis'), ('Flu', 'Asthma'))
+            self.assertIsNone(cache.get('m', 'diagnosis', {'temperature': 0.2}))
+
+            # Shared through the file with other processes
+            other = ResponseCache(cache.path, variants=2)
+            self.assertIn(other.get('m', 'diagnosis'), ('Flu', 'Asthma'))
+
+            cache.put('m', 'course', 'SQL')
+            cache.put('m', 'course', 'Algorithms')
+            cache.touch(cache.make_key('m', 'diagnosis'))
+            cache.evict()
+            self.assertEqual(len(cache), 3)
+            self.assertIsNone(ResponseCache(cache.path, variants=2).get('m', 'course'))
+
+            # Hits served from memory still refresh last_used, once per TOUCH_INTERVAL
+            later = time.time() + TOUCH_INTERVAL + 1
+            with patch('core.ai_cache.time.time', return_value=later):
+                cache.get('m', 'diagnosis')
+            last_used = cache.connect().execute("SELECT MIN(last_used) FROM responses WHERE key = ?",
+                                                (cache.make_key('m', 'diagnosis'),)).fetchone()[0]
+            self.assertEqual(last_used, later)
+            cache.close()
+            other.close()
+
+        # Agent side: only the first `variants` cells reach the model
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllamaHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                ai_config = {'enabled': True, 'api_url': f'http://127.0.0.1:{server.server_port}/api/generate', 'model': 'cached',
+                             'cache': {'enabled': True, 'path': os.path.join(tmp, 'llm.db'), 'variants': 2}}
+                plan = compile_column_plan([('diagnosis', 'text', True)], ai_config=ai_config)
+                rows = [generate_row(None, plan=plan) for _ in range(5)]
+                self.assertEqual(set(rows), {('Chest pain',)})
+                stats = get_ai_agent(ai_config).get_stats()
+                self.assertEqual(stats['calls'], 2)
+                self.assertEqual(stats['cache_hits'], 3)
+                get_ai_agent(ai_config).cache.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_batched_prompts(self):
+        """Test that batch replies are parsed and deduped, and one call fills a column buffer."""
+        self.assertEqual(parse_batch_reply('["Flu", "flu", " Asthma ", 3]', 10), ['Flu', 'Asthma', '3'])
+        self.assertEqual(parse_batch_reply('Here you go:\n1. Flu\n2) Asthma\n- Migraine\nThanks', 2), ['Flu', 'Asthma'])
+        self.assertEqual(parse_batch_reply('I cannot help with that.', 5), [])
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllamaBatchHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            ai_config = {'enabled': True, 'api_url': f'http://127.0.0.1:{server.server_port}/api/generate',
+                         'model': 'batched', 'values_per_call': 5}
+            plan = compile_column_plan([('diagnosis', 'text', True)], ai_config=ai_config)
+            values = [generate_row(None, plan=plan)[0] for _ in range(10)]
+            # 3 valid values per reply, the other 2 slots come from the fallback
+            self.assertEqual(values[:3], ['Flu', 'Asthma', 'Migraine'])
+            self.assertEqual(values[5:8], ['Flu', 'Asthma', 'Migraine'])
+            self.assertTrue(all(v in plan[0].fallback.options for v in values[3:5]))
+            self.assertEqual(get_ai_agent(ai_config).get_stats()['calls'], 2)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_async_ai_client(self):
+        """Test concurrent async AI calls with an in-flight limit, retries, timeouts and cancellation."""
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllamaSlowHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            url = f'http://127.0.0.1:{server.server_port}/api/generate'
+            ai_config = {'enabled': True, 'api_url': url, 'model': 'async', 'async_requests': True,
+                         'max_in_flight': 3, 'retries': 1, 'retry_backoff': 0.01}
+            plan = compile_column_plan([('diagnosis', 'text', True), ('age', 'integer', True)], ai_config=ai_config)
+            rows = generate_chunk(9, plan, columnar=True)
+            self.assertEqual(len(rows), 9)
+            self.assertEqual({r[0] for r in rows}, {'Chest pain'}) # the failed first call was retried
+            self.assertEqual(FakeOllamaSlowHandler.peak, 3)
+            stats = get_async_ai_client(ai_config).get_stats()
+            self.assertEqual((stats['calls'], stats['errors'], stats['retries']), (10, 1, 1))
+            self.assertLessEqual(stats['connections'], 3)
+
+            # Timed-out and cancelled requests fall back to Faker values
+            FakeOllamaSlowHandler.delay = 1.0
+            slow = {'enabled': True, 'api_url': url, 'model': 'slow', 'async_requests': True, 'timeout': 0.1, 'retries': 0}
+            plan = compile_column_plan([('diagnosis', 'text', True)], ai_config=slow)
+            values = [v for (v,) in generate_chunk(2, plan)]
+            self.assertTrue(all(v in plan[0].fallback.options for v in values))
+            self.assertEqual(get_async_ai_client(slow).get_stats()['errors'], 2)
+
+            slow = dict(slow, model='cancelled', timeout=5)
+            plan = compile_column_plan([('diagnosis', 'text', True)], ai_config=slow)
+            plan[0].prefetch(3)
+            start = time.time()
+            cancel_ai_requests()
+            values = plan[0].batch(3, None)
+            self.assertLess(time.time() - start, 0.5)
+            self.assertTrue(all(v in plan[0].fallback.options for v in values))
+        finally:
+            FakeOllamaSlowHandler.delay = 0.2
+            server.shutdown()
+            server.server_close()
+
+    def test_ai_prefetcher(self):
+        """Test background AI pools, the per-table wait budget and the circuit breaker."""
+        breaker = CircuitBreaker(threshold=2, cooldown=0.1)
+        breaker.record(False)
+        self.assertTrue(breaker.allow())
+        breaker.record(False)
+        self.assertFalse(breaker.allow())
+        time.sleep(0.1)
+        self.assertTrue(breaker.allow()) # half-open trial
+        self.assertFalse(breaker.allow())
+        breaker.record(True)
+        self.assertTrue(breaker.allow())
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllamaBatchHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            ai_config = {'enabled': True, 'api_url': f'http://127.0.0.1:{server.server_port}/api/generate', 'model': 'prefetch',
+                         'background_prefetch': True, 'values_per_call': 5, 'prefetch_pool': 6, 'max_wait': 2, 'table': 'encounters'}
+            plan = compile_column_plan([('diagnosis', 'text', True)], ai_config=ai_config)
+            before = ai_worker_stats() or {'ai_cells': 0, 'fallback_cells': 0}
+            values = [v for (v,) in generate_chunk(4, plan, columnar=True)]
+            self.assertEqual(values[:3], ['Flu', 'Asthma', 'Migraine'])
+            stats = ai_worker_stats()
+            from_ai = stats['ai_cells'] - before['ai_cells']
+            self.assertGreaterEqual(from_ai, 3)
+            self.assertEqual(from_ai + stats['fallback_cells'] - before['fallback_cells'], 4)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # Nothing listens on this port: the breaker opens and rows stop waiting
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        prefetcher = AIPrefetcher({'api_url': f'http://127.0.0.1:{port}/api/generate', 'model': 'down',
+                                   'values_per_call': 5, 'max_wait': 0.5, 'table_budget': 10, 'breaker_threshold': 2})
+        start = time.time()
+        results = [prefetcher.take('orders', 'product') for _ in range(50)]
+        self.assertEqual(results, [None] * 50)
+        self.assertTrue(prefetcher.breaker.is_open)
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(prefetcher.ai_share(), 0.0)
+        prefetcher.stop()
+
+        # The table budget caps the total wait
+        slow = AIPrefetcher({'api_url': f'http://127.0.0.1:{port}/api/generate', 'model': 'down',
+                             'max_wait': 0.2, 'table_budget': 0.3, 'prefetch_threads': 0})
+        start = time.time()
+        self.assertIsNone(slow.take('orders', 'product'))
+        self.assertIsNone(slow.take('orders', 'product'))
+        self.assertIsNone(slow.take('orders', 'product'))
+        self.assertLess(time.time() - start, 0.45)
+
+    def test_mock_ollama(self):
+        """Test the mock Ollama server's batch replies, error injection and latency stats."""
+        with MockOllama(latency=Latency('constant', 0.01)) as mock:
+            agent = AIAgent({'ai': {'api_url': mock.url, 'model': 'mock'}, 'generation': {'use_ai_mode': True}})
+            values = agent.generate_batch('encounters', 'diagnosis', 10)
+            self.assertEqual(len(values), 10)
+            self.assertIn('Asthma', values)
+            self.assertIsNotNone(agent.generate_text('grades', 'course'))
+            st = mock.stats()
+            self.assertEqual((st['calls'], st['errors']), (2, 0))
+            self.assertGreaterEqual(st['p50'], 0.01)
+
+            mock.error_rate = 1.0
+            mock.reset()
+            self.assertEqual(agent.generate_batch('encounters', 'diagnosis', 5), [])
+            self.assertEqual(mock.stats()['errors'], 1)
+
+            mock.error_rate, mock.malformed_rate = 0.0, 1.0
+            self.assertEqual(agent.generate_batch('encounters', 'diagnosis', 5), [])
+
+    def test_bulk_load_session(self):
+        """Test that a bulk-load session commits on its row interval and restores the PRAGMAs."""
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DBConnector({'load': {'commit_every': 5}})
+            db.db_path = os.path.join(tmp, 'test.db')
+            db.init_domain('Education')
+            count = lambda: db.execute_query("SELECT COUNT(*) FROM students")[0][0]
+
+            session = db.bulk_load()
+            self.assertEqual(session.conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+            for i in range(7):
+                session.insert('students', ['name', 'major'], [(f'S{i}', 'CS')])
+            self.assertEqual(len(session.statements), 1)
+            self.assertEqual(count(), 5) # the last 2 rows are not committed yet
+            session.end_table('students') # children read the table's keys right after
+            self.assertEqual(count(), 7)
+            session.close()
+            self.assertEqual(count(), 7)
+            self.assertEqual(db.execute_query("PRAGMA journal_mode")[0][0], 'delete')
+
+            with db.bulk_load(commit_every=0) as session:
+                session.insert('students', ['name', 'major'], [('A', 'Math'), ('B', 'Math')])
+                self.assertEqual(count(), 7)
+                session.end_table('students')
+                self.assertEqual(count(), 9)
+
+    def test_batch_writer(self):
+        """Test that the writer thread groups queued batches, commits per table and fails only the table that failed."""
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DBConnector({})
+            db.db_path = os.path.join(tmp, 'test.db')
+            db.init_domain('Education')
+            session = db.bulk_load()
+            gate = threading.Event()
+            insert = session.insert
+            def slow_insert(*args):
+                gate.wait()
+                return insert(*args)
+            session.insert = slow_insert
+
+            writer = BatchWriter(session, max_buffered=4)
+            for i in range(4):
+                writer.put('students', ['name'], [(f'S{i}a',), (f'S{i}b',)])
+            gate.set()
+            writer.end_table('students')
+            self.assertEqual(db.execute_query("SELECT COUNT(*) FROM students")[0][0], 8)
+            m = writer.metrics()
+            self.assertEqual((m['batches'], m['rows_committed']), (4, 8))
+            self.assertLess(m['writes'], 4)
+
+            writer.put('missing_table', ['name'], [('x',)])
+            with self.assertRaises(Exception):
+                writer.end_table('missing_table')
+            writer.abort_table('missing_table')
+
+            # A failed batch takes its table's earlier rows with it, not the other tables'
+            self.assertEqual(db.row_counts.get('grades'), 0)
+            writer.put('students', ['name'], [('y',)])
+            writer.put('grades', ['course'], [('Algebra',)])
+            writer.end_table('students') # also commits the first grade
+            self.assertEqual(db.row_counts.get('grades'), 1)
+            writer.put('grades', ['course', 'nope'], [('Bad', 1)])
+            writer.put('students', ['name'], [('z',)])
+            with self.assertRaises(Exception):
+                writer.end_table('grades')
+            writer.abort_table('grades')
+            writer.end_table('students')
+            writer.close()
+            session.close()
+            self.assertEqual(db.execute_query("SELECT COUNT(*) FROM students")[0][0], 10)
+            self.assertEqual(db.execute_query("SELECT COUNT(*) FROM grades")[0][0], 0)
+            self.assertEqual(db.row_counts.get('grades'), 0)
+
+    def test_failed_table_is_isolated(self):
+        """Test that a table whose writes fail counts 0 rows, skips its children and leaves the rest of the run writing."""
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DBConnector({})
+            db.db_path = os.path.join(tmp, 'user.db')
+            db.execute_query("CREATE TABLE a (id INTEGER PRIMARY KEY AUTOINCREMENT, score INTEGER CHECK (score < 0))")
+            db.execute_query("CREATE TABLE b (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT)")
+            db.execute_query("CREATE TABLE c (id INTEGER PRIMARY KEY AUTOINCREMENT, a_id INTEGER REFERENCES a(id))")
+            parser = SchemaParser(db)
+            parser.build_dependency_graph()
+            errors = {}
+            config = {'generation': {'batch_size': 10, 'workers': 2, 'use_ai_mode': False},
+                      'load': {'commit_every': 15}}
+            with DataGenerator(db, config) as generator:
+                results = generator.seed_tables(parser.get_generations(), 40,
+                                                on_table_done=lambda t, rows, err: errors.update({t: err}))
+            self.assertEqual(results, {'a': 0, 'b': 40, 'c': 0})
+            self.assertIsInstance(errors['a'], sqlite3.IntegrityError)
+            self.assertIsNone(errors['b'])
+            self.assertIsInstance(errors['c'], TableSkipped)
+            self.assertEqual(db.execute_query("SELECT COUNT(*) FROM a")[0][0], 0)
+            self.assertEqual(db.execute_query("SELECT COUNT(*) FROM b")[0][0], 40)
+            self.assertEqual(db.execute_query("SELECT COUNT(*) FROM c")[0][0], 0)
+            self.assertEqual(parser.get_table_stats(), {'a': 0, 'b': 40, 'c': 0})
+
+    def test_deferred_constraints(self):
+        """Test that a load drops and rebuilds a user schema's indexes and triggers and checks foreign keys once."""
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DBConnector({})
+            db.db_path = os.path.join(tmp, 'user.db')
+            schema = [
+                "CREATE TABLE authors (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, updated TEXT)",
+                "CREATE TABLE books (id INTEGER PRIMARY KEY AUTOINCREMENT, author_id INTEGER REFERENCES authors(id), title TEXT)",
+                "CREATE INDEX idx_books_author ON books (author_id)",
+                "CREATE TRIGGER trg_authors AFTER UPDATE ON authors BEGIN UPDATE authors SET updated = 'yes' WHERE id = NEW.id; END",
+            ]
+            for sql in schema:
+                db.execute_query(sql)
+            objects = lambda: sorted(row[0] for row in db.execute_query(
+                "SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')"))
+
+            session = db.bulk_load()
+            session.suspend_constraints(['authors', 'books'])
+            self.assertEqual(objects(), [])
+            session.insert('books', ['author_id', 'title'], [(99, 'Orphan')])
+            violations = session.restore_constraints()
+            session.close()
+            self.assertEqual(objects(), ['idx_books_author', 'trg_authors'])
+            self.assertEqual([(v[0], v[2]) for v in violations], [('books', 'authors')])
+            db.execute_query("DELETE FROM books")
+
+            parser = SchemaParser(db)
+            parser.build_dependency_graph()
+            config = {'generation': {'batch_size': 10, 'workers': 2, 'use_ai_mode': False},
+                      'load': {'defer_constraints': True}}
+            with DataGenerator(db, config) as generator:
+                results = generator.seed_tables(parser.get_generations(), {'authors': 20, 'books': 60})
+                self.assertEqual(results, {'authors': 20, 'books': 60})
+                self.assertEqual(objects(), ['idx_books_author', 'trg_authors'])
+
+                db.execute_query("INSERT INTO books (author_id, title) VALUES (999, 'Orphan')")
+                with self.assertRaises(ForeignKeyError):
+                    generator.seed_table('books', 5)
+            self.assertEqual(objects(), ['idx_books_author', 'trg_authors'])
+
+            # Unique indexes stay during the load, and an object that cannot be rebuilt is reported, not lost
+            for sql in ["CREATE TABLE staff (id INTEGER PRIMARY KEY, dept TEXT, updated TEXT)",
+                        "CREATE UNIQUE INDEX ux_dept ON staff (dept)",
+                        "CREATE INDEX ix_upd ON staff (updated)",
+                        "CREATE TRIGGER trg_staff AFTER UPDATE ON staff BEGIN UPDATE staff SET updated = 'yes' WHERE id = NEW.id; END"]:
+                db.execute_query(sql)
+            session = db.bulk_load()
+            session.suspend_constraints(['staff'])
+            self.assertIn('ux_dept', objects())
+            session.insert('staff', ['dept'], [('sales',)])
+            with self.assertRaises(sqlite3.IntegrityError):
+                session.insert('staff', ['dept'], [('sales',)])
+            session.suspended.insert(0, "CREATE INDEX ix_broken ON staff (missing)")
+            with self.assertRaises(RestoreError) as ctx:
+                session.restore_constraints()
+            session.close()
+            self.assertEqual([sql for sql, _ in ctx.exception.failed], ["CREATE INDEX ix_broken ON staff (missing)"])
+            self.assertEqual(objects(), ['idx_books_author', 'ix_upd', 'trg_authors', 'trg_staff', 'ux_dept'])
+            self.assertEqual(db.execute_query("SELECT dept FROM staff"), [('sales',)])
+
+    def test_staged_build(self):
+        """Test that a staged build leaves the file untouched until it completes, then swaps it in."""
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, 'test.db')
+            for where in ('memory', os.path.join(tmp, 'shm')):
+                os.makedirs(os.path.join(tmp, 'shm'), exist_ok=True)
+                db = DBConnector({'load': {'build': where}})
+                db.db_path = target
+                db.init_domain('E-commerce')
+                on_disk = lambda: sqlite3.connect(target).execute("SELECT COUNT(*) FROM users").fetchone()[0]
+                parser = SchemaParser(db)
+                parser.build_dependency_graph()
+
+                seen = []
+                config = {'generation': {'batch_size': 10, 'workers': 2, 'use_ai_mode': False}}
+                with DataGenerator(db, config) as generator:
+                    results = generator.seed_tables(parser.get_generations(), 25,
+                                                    on_table_done=lambda t, rows, err: seen.append(on_disk()))
+                self.assertEqual(seen, [0, 0, 0])
+                self.assertEqual(db.db_path, target)
+                self.assertEqual(parser.get_table_stats(), results)
+
+                # A failed build discards its copy
+                with self.assertRaises(RuntimeError):
+                    with db.staged_build():
+                        db.execute_query("DELETE FROM users")
+                        raise RuntimeError("crash")
+                self.assertEqual(on_disk(), 25)
+                self.assertEqual(os.listdir(os.path.join(tmp, 'shm')), [])
+                # Only the target's schema snapshot is cached, not the staging copy's
+                sources = []
+                for name in os.listdir(self.catalog_dir):
+                    with open(os.path.join(self.catalog_dir, name)) as f:
+                        sources.append(json.load(f)['source'])
+                self.assertEqual(sources, [os.path.abspath(target)])
+
+                # So does a run in which a table failed
+                with DataGenerator(db, config) as generator:
+                    seed_table = generator.seed_table
+                    def failing(table, rows, shared_by=1):
+                        if table == 'users':
+                            raise RuntimeError("worker died")
+                        return seed_table(table, rows, shared_by)
+                    generator.seed_table = failing
+                    with self.assertRaises(RuntimeError):
+                        generator.seed_tables(parser.get_generations(), 25)
+                self.assertEqual(on_disk(), 25)
+                self.assertEqual(sqlite3.connect(target).execute("SELECT COUNT(*) FROM orders").fetchone()[0], 25)
+                self.assertEqual(sorted(os.listdir(tmp)), ['shm', 'test.db'])
+
+    def test_sharded_writes(self):
+        """Test that workers write their own shards and the merge keeps ids contiguous and foreign keys valid."""
+        with tempfile.TemporaryDirectory() as tmp:
+            shard_dir = os.path.join(tmp, 'shards')
+            os.makedirs(shard_dir)
+            db = DBConnector({'load': {'shard_dir': shard_dir}})
+            db.db_path = os.path.join(tmp, 'test.db')
+            db.init_domain('E-commerce')
+            db.execute_query("INSERT INTO users (name) VALUES ('existing')")
+            parser = SchemaParser(db)
+            parser.build_dependency_graph()
+
+            merged = []
+            paths = Shards.paths
+            tuned = []
+            record = BatchTuner.record
+            config = {'generation': {'batch_size': 10, 'workers': 3, 'use_ai_mode': False, 'autotune': True},
+                      'load': {'shards': True}}
+            with DataGenerator(db, config) as generator, \
+                    patch.object(Shards, 'paths', lambda shards: merged.append(paths(shards)) or merged[-1]), \
+                    patch.object(BatchTuner, 'record', lambda tuner, rows, *args: tuned.append(rows) or record(tuner, rows, *args)):
+                results = generator.seed_tables(parser.get_generations(), {'users': 45, 'products': 30, 'orders': 80})
+            self.assertEqual(results, {'users': 45, 'products': 30, 'orders': 80})
+            self.assertEqual(sum(tuned), 155) # the tuner sees the sharded batches
+            self.assertGreater(max(len(p) for p in merged), 1) # one shard per worker
+
+            self.assertEqual(db.execute_query("SELECT MIN(id), MAX(id), COUNT(*) FROM users")[0], (1, 46, 46))
+            self.assertEqual(db.execute_query("SELECT MIN(id), MAX(id), COUNT(*) FROM orders")[0], (1, 80, 80))
+            orphans = db.execute_query(
+                "SELECT COUNT(*) FROM orders WHERE user_id NOT IN (SELECT id FROM users) "
+                "OR product_id NOT IN (SELECT id FROM products)")
+            self.assertEqual(orphans[0][0], 0)
+            self.assertEqual(os.listdir(shard_dir), [])
+
+    def test_domain_templates(self):
+        """Test that init_domain swaps in a cached template and rebuilds it when the DDL changes."""
+        with tempfile.TemporaryDirectory() as tmp:
+            templates = os.path.join(tmp, 'templates')
+            db = DBConnector({'database': {'template_dir': templates}})
+            db.db_path = os.path.join(tmp, 'test.db')
+            db.init_domain('Finance')
+            self.assertEqual(len(os.listdir(templates)), 1)
+            db.execute_query("PRAGMA journal_mode = WAL")
+            db.bulk_insert('accounts', ['owner'], [('a',), ('b',)])
+
+            db.init_domain('Finance')
+            self.assertEqual(db.execute_query("SELECT COUNT(*) FROM accounts")[0][0], 0)
+            self.assertEqual(db.execute_query("PRAGMA journal_mode")[0][0], 'delete')
+            self.assertEqual(sorted(os.listdir(tmp)), ['templates', 'test.db'])
+
+            db.init_domain('IoT')
+            self.assertEqual(sorted(db.fetch_tables()), ['readings', 'sensors'])
+            self.assertEqual(len(os.listdir(templates)), 2)
+
+            old = db.domain_template('IoT')
+            ddl = DBConnector.DOMAINS['IoT'] + ["CREATE INDEX idx_readings_sensor ON readings (sensor_id)"]
+            with patch.dict(DBConnector.DOMAINS, {'IoT': ddl}):
+                db.init_domain('IoT')
+                self.assertNotIn(old, [os.path.join(templates, n) for n in os.listdir(templates)])
+                self.assertEqual(len(os.listdir(templates)), 2)
+                self.assertEqual(db.execute_query("SELECT name FROM sqlite_master WHERE type = 'index'"),
+                                 [('idx_readings_sensor',)])
+
+    def test_catalog_snapshot(self):
+        """Test that the schema snapshot matches the PRAGMAs, is reused from memory and disk, and follows schema changes."""
+        with tempfile.TemporaryDirectory() as tmp:
+            settings = {'database': {'catalog_dir': os.path.join(tmp, 'catalog'),
+                                     'template_dir': os.path.join(tmp, 'templates')}}
+            db = DBConnector(settings)
+            db.db_path = os.path.join(tmp, 'test.db')
+            db.init_domain('E-commerce')
+            catalog = db.catalog()
+            self.assertEqual(catalog.tables, ['users', 'products', 'orders'])
+            self.assertEqual(catalog.columns['orders'], db.execute_query("PRAGMA table_info(orders)"))
+            self.assertEqual(sorted(catalog.foreign_keys['orders']),
+                             [('product_id', 'products', 'id'), ('user_id', 'users', 'id')])
+            self.assertIs(db.catalog(), catalog)
+            self.assertEqual(len(os.listdir(os.path.join(tmp, 'catalog'))), 1)
+
+            other = DBConnector(settings)
+            other.db_path = db.db_path
+            with patch('core.db_connector.Catalog.from_rows') as from_rows:
+                self.assertEqual(other.catalog().columns, catalog.columns) # read from disk
+            from_rows.assert_not_called()
+
+            # Threads that reload the same snapshot at once each write their own temp file
+            errors = []
+            def reload():
+                try:
+                    fresh = DBConnector(settings)
+                    fresh.db_path = db.db_path
+                    with patch('core.db_connector.Catalog.from_json', side_effect=ValueError):
+                        fresh.catalog()
+                except Exception as e:
+                    errors.append(e)
+            threads = [threading.Thread(target=reload) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(errors, [])
+
+            db.execute_query("CREATE TABLE reviews (id INTEGER PRIMARY KEY, order_id INTEGER REFERENCES orders(id))")
+            self.assertEqual(db.foreign_keys('reviews'), [('order_id', 'orders', 'id')])
+            db.init_domain('Finance')
+            self.assertEqual(other.fetch_tables(), ['accounts', 'transactions'])
+
+            # Snapshots of deleted databases are pruned when another one is cached
+            os.remove(db.db_path)
+            db.db_path = os.path.join(tmp, 'second.db')
+            db.init_domain('IoT')
+            db.catalog()
+            self.assertEqual(len(os.listdir(os.path.join(tmp, 'catalog'))), 1)
+
+    def test_row_counts(self):
+        """Test that row counts follow seeding without COUNT(*), are estimated on a fresh connector and recounted on request."""
+        with tempfile.TemporaryDirectory() as tmp:
+            settings = {'database': {'catalog_dir': os.path.join(tmp, 'catalog'),
+                                     'template_dir': os.path.join(tmp, 'templates')}}
+            db = DBConnector(settings)
+            db.db_path = os.path.join(tmp, 'test.db')
+            db.init_domain('E-commerce')
+            parser = SchemaParser(db)
+            parser.build_dependency_graph()
+            self.assertEqual(parser.get_table_stats(), {'users': 0, 'products': 0, 'orders': 0})
+            config = {'generation': {'batch_size': 50, 'workers': 1, 'use_ai_mode': False}}
+            with DataGenerator(db, config) as generator:
+                with patch.object(db.row_counts, 'recount') as recount:
+                    generator.seed_tables(parser.get_generations(), 120)
+                    self.assertEqual(parser.get_table_stats(), {'users': 120, 'products': 120, 'orders': 120})
+                recount.assert_not_called()
+
+            db.execute_query("DELETE FROM orders WHERE id > 100")
+            self.assertEqual(parser.get_table_stats()['orders'], 120) # not seen until recounted
+            self.assertEqual(parser.get_table_stats(exact=True)['orders'], 100)
+            self.assertTrue(db.row_counts.is_exact('orders'))
+
+            fresh = DBConnector(settings)
+            fresh.db_path = db.db_path
+            self.assertEqual(fresh.row_counts.get('users'), 120) # MAX(rowid)
+            fresh.execute_query("CREATE TABLE tags (name TEXT PRIMARY KEY) WITHOUT ROWID")
+            fresh.execute_query("INSERT INTO tags VALUES ('a'), ('b'), ('c')")
+            fresh.execute_query("ANALYZE")
+            self.assertEqual(fresh.row_counts.get('tags'), 3) # sqlite_stat1
+
+            db.init_domain('E-commerce')
+            self.assertEqual(db.row_counts.get('users'), 0)
+
+    @unittest.skipUnless(os.environ.get('DATAFORGE_PG_DSN'), "set DATAFORGE_PG_DSN to a scratch Postgres database")
+    def test_postgres_backend(self):
+        """Test seeding through COPY on Postgres, with pg_catalog introspection, in text and binary format."""
+        for copy_format in ('text', 'binary'):
+            db = create_connector({'database': {'backend': 'postgres', 'dsn': os.environ['DATAFORGE_PG_DSN'],
+                                                'copy_format': copy_format}})
+            try:
+                db.init_domain('Finance')
+                self.assertEqual(db.foreign_keys('transactions'), [('account_id', 'accounts', 'id')])
+                columns = {row[1]: row for row in db.table_columns('accounts')}
+                self.assertEqual(columns['id'][5], 1)
+                self.assertEqual(columns['balance'][2], 'double precision')
+
+                parser = SchemaParser(db)
+                parser.build_dependency_graph()
+                config = {'generation': {'batch_size': 25, 'workers': 2, 'use_ai_mode': False},
+                          'load': {'defer_constraints': copy_format == 'binary'}}
+                with DataGenerator(db, config) as generator:
+                    results = generator.seed_tables(parser.get_generations(), {'accounts': 40, 'transactions': 120})
+                self.assertEqual(parser.get_table_stats(), results)
+                orphans = db.execute_query("SELECT COUNT(*) FROM transactions WHERE account_id NOT IN (SELECT id FROM accounts)")
+                self.assertEqual(orphans[0][0], 0)
+            finally:
+                db.close()
+
 if __name__ == '__main__':
     unittest.main()
@@ -5,9 +5,9 @@ from textual.screen import Screen
 from textual.worker import Worker
 from ui.panels import TableList, VisualizerPanel, LogPanel
 from ui.visualizer import SchemaVisualizer
-from core.db_connector import DBConnector
+from core.db_connector import ForeignKeyError, RestoreError, create_connector
 from core.schema_parser import SchemaParser
-from core.generator import DataGenerator
+from core.generator import DataGenerator, SeedingCancelled, TableSkipped
 import yaml
 import time
 
@@ -47,10 +47,12 @@ class DataForgeApp(App):
 
     BINDINGS = [
         ("s", "start_seeding", "Start Seeding"),
+        ("c", "cancel_seeding", "Cancel Seeding"),
         ("d", "show_data", "View Data"),
         ("e", "export_csv", "Export CSV"),
         ("x", "export_sql", "Export SQL"),
         ("r", "reset_db", "Reset DB"),
+        ("n", "recount", "Recount Rows"),
         ("m", "main_menu", "Back to Menu"),
         ("q", "quit", "Quit"),
     ]
@@ -58,10 +60,11 @@ class DataForgeApp(App):
     def __init__(self):
         super().__init__()
         self.config = self.load_config()
-        self.db_connector = DBConnector(self.config)
+        self.db_connector = create_connector(self.config)
         self.schema_parser = None
         self.sorted_tables = []
         self.seeding_active = False
+        self.generator = None
         self.current_domain = None
 
     def load_config(self, config_path="config/settings.yaml"):
@@ -179,41 +182,68 @@ class DataForgeApp(App):
         self.query_one(CompletedTables).clear_completed()
         self.run_worker(self.run_seeding_process, exclusive=True, thread=True)
 
+    def action_cancel_seeding(self):
+        """Stop the running seeding process after the current batch."""
+        if self.seeding_active and self.generator:
+            self.generator.cancel()
+            self.update_progress(2, 0, "Cancelling...")
+
     def run_seeding_process(self):
         """Background worker for seeding."""
-        generator = DataGenerator(self.db_connector, self.config)
+        status = "Seeding complete!"
         total_tables = len(self.sorted_tables)
-        
-        for idx, table in enumerate(self.sorted_tables):
-            progress_pct = int((idx / total_tables) * 100)
+        done = []
+
+        def table_started(table):
+            progress_pct = int((len(done) / total_tables) * 100)
             self.call_from_thread(self.update_progress, 2, progress_pct, f"Seeding: {table}")
-            
-            try:
-                generator.seed_table(table, 100)  # 100 rows per table
-                
-                # Get row count
-                stats = self.schema_parser.get_table_stats()
-                row_count = stats.get(table, 0)
-                
-                # Add to completed
-                self.call_from_thread(self.query_one(CompletedTables).add_completed, table, row_count)
-                
-                # Remove from remaining
-                def remove_table():
-                    table_list = self.query_one(TableList)
-                    table_list.remove_table(table)
-                self.call_from_thread(remove_table)
-                
-                # Update visualizer
-                visualizer = SchemaVisualizer(self.schema_parser.graph)
-                tree = visualizer.generate_tree(stats)
-                self.call_from_thread(self.query_one(VisualizerPanel).update_content, tree)
-                
-            except Exception as e:
-                self.call_from_thread(self.update_progress, 2, progress_pct, f"Error: {e}")
-        
-        self.call_from_thread(self.update_progress, 2, 100, "Seeding complete!")
-        self.seeding_active = False
+
+        def table_done(table, rows, error):
+            done.append(table)
+            progress_pct = int((len(done) / total_tables) * 100)
+            if isinstance(error, TableSkipped):
+                self.call_from_thread(self.update_progress, 2, progress_pct, f"Skipped {table}: {error}")
+                return
+            if error:
+                self.call_from_thread(self.update_progress, 2, progress_pct, f"Error: {error}")
+                return
+
+            # Get row count
+            stats = self.schema_parser.get_table_stats()
+            row_count = stats.get(table, 0)
+
+            # Add to completed
+            self.call_from_thread(self.query_one(CompletedTables).add_completed, table, row_count)
+
+            # Remove from remaining
+            def remove_table():
+                table_list = self.query_one(TableList)
+                table_list.remove_table(table)
+            self.call_from_thread(remove_table)
+
+            # Update visualizer
+            visualizer = SchemaVisualizer(self.schema_parser.graph)
+            tree = visualizer.generate_tree(stats)
+            self.call_from_thread(self.query_one(VisualizerPanel).update_content, tree)
+
+        try:
+            with DataGenerator(self.db_connector, self.config) as generator:
+                self.generator = generator
+                # Tables whose parents are done are seeded together
+                generator.seed_tables(self.schema_parser.get_generations(), 100,  # 100 rows per table
+                                      on_table_start=table_started, on_table_done=table_done)
+        except SeedingCancelled:
+            status = f"Seeding cancelled after {len(done)}/{total_tables} tables"
+        except ForeignKeyError as e:
+            status = f"Seeded, but {len(e.violations)} foreign key violation(s), first: {e.violations[0]}"
+        except RestoreError as e:
+            status = f"Seeded, but {len(e.failed)} index/trigger(s) could not be rebuilt: {e.failed[0][0]}"
+        except Exception as e:
+            status = f"Seeding failed: {e}"
+        finally:
+            self.generator = None
+            self.seeding_active = False
+        self.call_from_thread(self.update_progress, 2, 100, status)
 
     def action_show_data(self):
         """Show sample data from all tables."""
@@ -224,12 +254,12 @@ class DataForgeApp(App):
     def show_data_preview(self):
         """Display sample data from each table."""
         output_lines = ["[bold cyan]📊 DATA PREVIEW[/bold cyan]\n"]
+        catalog = self.db_connector.catalog()
         
         for table in self.sorted_tables:
             try:
-                cols = self.db_connector.execute_query(f"PRAGMA table_info({table})")
-                count_result = self.db_connector.execute_query(f"SELECT COUNT(*) FROM {table}")
-                count = count_result[0][0] if count_result else 0
+                cols = catalog.columns.get(table, [])
+                count = self.db_connector.row_counts.get(table)
                 
                 output_lines.append(f"\n[bold yellow]📋 {table.upper()}[/bold yellow] ({count} rows)")
                 output_lines.append("-" * 40)
@@ -265,10 +295,11 @@ class DataForgeApp(App):
         os.makedirs(export_dir, exist_ok=True)
         
         self.call_from_thread(self.update_progress, 2, 0, "Exporting to CSV...")
+        catalog = self.db_connector.catalog()
         
         for idx, table in enumerate(self.sorted_tables):
             try:
-                cols = self.db_connector.execute_query(f"PRAGMA table_info({table})")
+                cols = catalog.columns.get(table, [])
                 col_names = [c[1] for c in cols]
                 rows = self.db_connector.execute_query(f"SELECT * FROM {table}")
                 
@@ -301,6 +332,7 @@ class DataForgeApp(App):
         filepath = os.path.join(export_dir, "dataforge_dump.sql")
         
         self.call_from_thread(self.update_progress, 2, 0, "Exporting to SQL...")
+        catalog = self.db_connector.catalog()
         
         with open(filepath, 'w', encoding='utf-8') as f:
             f.write("-- DataForge SQL Dump\n")
@@ -308,7 +340,7 @@ class DataForgeApp(App):
             
             for idx, table in enumerate(self.sorted_tables):
                 try:
-                    cols = self.db_connector.execute_query(f"PRAGMA table_info({table})")
+                    cols = catalog.columns.get(table, [])
                     col_names = [c[1] for c in cols]
                     rows = self.db_connector.execute_query(f"SELECT * FROM {table}")
                     
@@ -345,13 +377,12 @@ class DataForgeApp(App):
         """Clear all data from tables."""
         self.call_from_thread(self.update_progress, 2, 0, "Resetting database...")
         
-        # Reverse order to handle foreign keys
-        for table in reversed(self.sorted_tables):
-            try:
-                self.db_connector.execute_query(f"DELETE FROM {table}")
-                self.call_from_thread(self.update_progress, 2, 50, f"Cleared: {table}")
-            except Exception as e:
-                self.call_from_thread(self.update_progress, 2, 0, f"Error: {e}")
+        # Swaps in the domain's empty template instead of deleting row by row
+        try:
+            self.db_connector.init_domain(self.current_domain)
+            self.call_from_thread(self.update_progress, 2, 50, f"Reset: {self.current_domain}")
+        except Exception as e:
+            self.call_from_thread(self.update_progress, 2, 0, f"Error: {e}")
         
         # Refresh visualizer
         stats = self.schema_parser.get_table_stats()
@@ -362,6 +393,21 @@ class DataForgeApp(App):
         
         self.call_from_thread(self.update_progress, 2, 100, "Database reset complete!")
 
+    def action_recount(self):
+        """Recount every table exactly (the panels otherwise show the running counters)."""
+        if not self.schema_parser:
+            return
+        self.run_worker(self.recount_rows, exclusive=True, thread=True)
+
+    def recount_rows(self):
+        """Runs COUNT(*) on every table and refreshes the visualizer."""
+        self.call_from_thread(self.update_progress, 2, 0, "Counting rows...")
+        stats = self.schema_parser.get_table_stats(exact=True)
+        visualizer = SchemaVisualizer(self.schema_parser.graph)
+        tree = visualizer.generate_tree(stats)
+        self.call_from_thread(self.query_one(VisualizerPanel).update_content, tree)
+        self.call_from_thread(self.update_progress, 2, 100, f"Counted {sum(stats.values())} rows")
+
 if __name__ == "__main__":
     app = DataForgeApp()
     app.run()
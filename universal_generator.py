@@ -1,8 +1,8 @@
-import requests
 import csv
 import random
 import time
 import os
+import yaml
 from datetime import datetime, timedelta
 from rich.console import Console
 from rich.table import Table
@@ -11,6 +11,9 @@ from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskPr
 from rich.prompt import Prompt, IntPrompt, Confirm
 from rich.theme import Theme
 
+from core.distributions import Picker
+from core.ai_prefetch import AIPrefetcher
+
 # --- SETUP RICH ---
 custom_theme = Theme({
     "info": "cyan",
@@ -42,25 +45,40 @@ PROGRESS_TEXT = "[progress.description]{task.description}"
 EXPORT_DIR = "exports"
 OLLAMA_URL = "http://localhost:11434/api/generate"
 OLLAMA_MODEL = "qwen"
+OLLAMA_TIMEOUT = 5
 AI_MODE = False
+SETTINGS_PATH = "config/settings.yaml"
 
-def get_ai_text(column, context=""):
-    """Fetch data from Ollama if AI_MODE is on."""
-    if not AI_MODE:
-        return None
-    
-    payload = {
-        "model": OLLAMA_MODEL,
-        "prompt": f"Generate a single realistic {column} for {context}. Return ONLY the value, no extra text.",
-        "stream": False
-    }
+def load_settings(config_path=SETTINGS_PATH):
     try:
-        response = requests.post(OLLAMA_URL, json=payload, timeout=5)
-        if response.status_code == 200:
-            return response.json().get("response", "").strip().strip('"')
-    except Exception:
+        with open(config_path, "r") as f:
+            return yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        return {}
+
+def load_distributions(config_path=SETTINGS_PATH):
+    """Per-column distributions from settings.yaml, shared with the DB seeder."""
+    return load_settings(config_path).get("distributions") or {}
+
+# Skewed picks (hot customers, popular products, noisy sensors); uniform when not configured
+picker = Picker(load_distributions())
+
+# AI values are fetched by background threads (settings.yaml `ai` section,
+# including its response cache); rows take one when ready, Faker otherwise
+prefetcher = None
+
+def get_prefetcher():
+    global prefetcher
+    if prefetcher is None:
+        ai = dict(load_settings().get("ai") or {}, api_url=OLLAMA_URL, model=OLLAMA_MODEL, timeout=OLLAMA_TIMEOUT)
+        prefetcher = AIPrefetcher(ai)
+    return prefetcher
+
+def get_ai_text(column, context="", table="csv"):
+    """A prefetched Ollama value if AI_MODE is on and one is ready, else None."""
+    if not AI_MODE:
         return None
-    return None
+    return get_prefetcher().take(table, column, f"For {context}.")
 
 def get_random_date(days_back=365):
     """Generates a random date within the last n days."""
@@ -89,10 +107,11 @@ def generate_ecommerce_data(num_rows):
         save_csv("users.csv", ["UserID", "Name", "Email", "City", "SignupDate"], users, sub)
         progress.advance(task)
         
+        user_ids = [u[0] for u in users]
         orders = []
         for i in range(1, num_rows + 1):
-            product = get_ai_text("e-commerce product name", "an online store") or random.choice(PRODUCTS)
-            orders.append([1000 + i, random.randint(1, num_rows), product, random.randint(1, 5), round(random.uniform(10.0, 1000.0), 2), get_random_date(30)])
+            product = get_ai_text("e-commerce product name", "an online store", "orders") or picker.pick("orders.product_id", PRODUCTS)
+            orders.append([1000 + i, picker.pick("orders.user_id", user_ids), product, random.randint(1, 5), picker.number("orders.price", 10.0, 1000.0), get_random_date(30)])
         save_csv("orders.csv", ["OrderID", "UserID", "Product", "Quantity", "Price", "OrderDate"], orders, sub)
         progress.advance(task)
     
@@ -110,9 +129,9 @@ def generate_healthcare_data(num_rows):
         
         encounters = []
         for i in range(1, num_rows + 1):
-            dept = random.choice(DEPARTMENTS)
-            diag = get_ai_text("medical diagnosis", f"the {dept} department") or random.choice(DIAGNOSES)
-            encounters.append([f"ENC-{1000+i}", random.choice(patient_ids), dept, diag, round(random.uniform(50.0, 5000.0), 2), random.choice(STATUSES), get_random_date(180)])
+            dept = picker.pick("encounters.department", DEPARTMENTS)
+            diag = get_ai_text("medical diagnosis", f"the {dept} department", "encounters") or picker.pick("encounters.diagnosis", DIAGNOSES)
+            encounters.append([f"ENC-{1000+i}", picker.pick("encounters.patient_id", patient_ids), dept, diag, picker.number("encounters.cost", 50.0, 5000.0), random.choice(STATUSES), get_random_date(180)])
         save_csv("encounters.csv", ["EncounterID", "PatientID", "Department", "Diagnosis", "Cost", "Status", "Date"], encounters, sub)
         progress.advance(task)
 
@@ -124,16 +143,16 @@ def generate_finance_data(num_rows):
         task = progress.add_task("[💰] Generating Finance Data...", total=2)
         
         account_ids = [f"ACC-{100+i}" for i in range(num_rows)]
-        accounts = [[aid, random.choice(NAMES), round(random.uniform(100.0, 100000.0), 2), random.choice(ACCOUNT_TYPES)] for aid in account_ids]
+        accounts = [[aid, random.choice(NAMES), picker.number("accounts.balance", 100.0, 100000.0), picker.pick("accounts.type", ACCOUNT_TYPES)] for aid in account_ids]
         save_csv("accounts.csv", ["AccountID", "CustomerName", "Balance", "Type"], accounts, sub)
         progress.advance(task)
         
         transactions = []
         for i in range(1, num_rows + 1):
             is_fraud = 1 if random.random() < 0.05 else 0
-            amount = round(random.uniform(1.0, 5000.0), 2)
+            amount = picker.number("transactions.amount", 1.0, 5000.0)
             if random.choice([True, False]): amount = -amount
-            transactions.append([f"TRX-{5000+i}", random.choice(account_ids), amount, random.choice(TRANSACTION_TYPES), get_random_date(90), is_fraud])
+            transactions.append([f"TRX-{5000+i}", picker.pick("transactions.account_id", account_ids), amount, picker.pick("transactions.type", TRANSACTION_TYPES), get_random_date(90), is_fraud])
         save_csv("transactions.csv", ["TransID", "AccountID", "Amount", "Type", "Date", "IsFraud"], transactions, sub)
         progress.advance(task)
 
@@ -147,7 +166,7 @@ def generate_iot_data(num_rows):
         sensor_ids = [f"SENS-{100+i}" for i in range(num_rows)]
         sensors = []
         for sid in sensor_ids:
-            loc = get_ai_text("industrial location name", "a manufacturing plant") or random.choice(ZONES)
+            loc = get_ai_text("industrial location name", "a manufacturing plant", "sensors") or random.choice(ZONES)
             sensors.append([sid, random.choice(SENSOR_TYPES), loc])
         save_csv("sensors.csv", ["SensorID", "Type", "Location"], sensors, sub)
         progress.advance(task)
@@ -155,10 +174,10 @@ def generate_iot_data(num_rows):
         readings = []
         base_time = datetime.now() - timedelta(hours=num_rows)
         for i in range(1, num_rows + 1):
-            sid = random.choice(sensor_ids)
+            sid = picker.pick("readings.sensor_id", sensor_ids)
             timestamp = (base_time + timedelta(minutes=i*10)).strftime("%Y-%m-%d %H:%M:%S")
             unit = "C" if "Temp" in sid else "Pa"
-            readings.append([f"READ-{10000+i}", sid, timestamp, round(random.uniform(-10.0, 100.0), 2), unit])
+            readings.append([f"READ-{10000+i}", sid, timestamp, picker.number("readings.value", -10.0, 100.0), unit])
         save_csv("readings.csv", ["ReadingID", "SensorID", "Timestamp", "Value", "Unit"], readings, sub)
         progress.advance(task)
 
@@ -176,8 +195,8 @@ def generate_education_data(num_rows):
         
         grades = []
         for i in range(1, num_rows + 1):
-            course = get_ai_text("university course title", "a computer science or physics curriculum") or random.choice(COURSES)
-            grades.append([f"GRD-{2000+i}", random.choice(student_ids), course, random.randint(0, 20), get_random_date(120)])
+            course = get_ai_text("university course title", "a computer science or physics curriculum", "grades") or picker.pick("grades.course", COURSES)
+            grades.append([f"GRD-{2000+i}", picker.pick("grades.student_id", student_ids), course, picker.number("grades.score", 0, 20, integer=True), get_random_date(120)])
         save_csv("grades.csv", ["GradeID", "StudentID", "Course", "Score", "ExamDate"], grades, sub)
         progress.advance(task)
 
@@ -194,6 +213,10 @@ def handle_generation(choice, rows):
     }
     if choice in modes:
         modes[choice](rows)
+        if AI_MODE and prefetcher is not None:
+            share = prefetcher.ai_share()
+            status = " [warning](endpoint unreachable, paused)[/warning]" if prefetcher.breaker.is_open else ""
+            console.print(f"[ai]🤖 AI-sourced values: {share:.0%}, the rest from Faker{status}[/ai]")
 
 # --- MAIN ---
 
@@ -1,12 +1,13 @@
 import yaml
-from core.db_connector import DBConnector
+from core.db_connector import create_connector
 
 def verify():
     with open("config/settings.yaml", "r") as f:
         config = yaml.safe_load(f)
     
-    db = DBConnector({'database': config['database']})
-    tables = db.fetch_tables()
+    db = create_connector(config)
+    catalog = db.catalog()
+    tables = catalog.tables
     
     print(f"Found {len(tables)} tables.")
     for table in tables:
@@ -14,8 +15,7 @@ def verify():
         print(f"Table '{table}': {count} rows")
         
         # Sample a few rows
-        cols = db.execute_query(f"SELECT column_name FROM information_schema.columns WHERE table_name = '{table}'")
-        col_names = [c[0] for c in cols]
+        col_names = [c[1] for c in catalog.columns[table]]
         
         print(f"  Columns: {col_names}")
         rows = db.execute_query(f"SELECT * FROM {table} LIMIT 3")